@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
@@ -240,6 +241,12 @@ class DocumentScannerApp:
         self.process_compression_var.trace('w', update_compression_label)
         update_compression_label()  # Инициализируем
         
+        # Число процессов для обрезки (каждый процесс загружает свою копию модели)
+        ttk.Label(compression_frame, text="Процессов:").grid(row=1, column=0, sticky='w', pady=(5, 0))
+        self.process_workers_var = tk.IntVar(value=1)
+        ttk.Spinbox(compression_frame, from_=1, to=os.cpu_count() or 1,
+                    textvariable=self.process_workers_var, width=5).grid(row=1, column=1, padx=5, pady=(5, 0), sticky='w')
+        
         self.process_btn = ttk.Button(main_frame, text="🚀 НАЧАТЬ ОБРАБОТКУ", 
                                     command=self.start_processing)
         self.process_btn.grid(row=6, column=0, columnspan=3, pady=20)
@@ -467,7 +474,8 @@ class DocumentScannerApp:
                     self.process_output_var.get(),
                     calibration_manager=self.calibration_manager,
                     progress_callback=update_progress,
-                    overwrite=self.process_overwrite_var.get()
+                    overwrite=self.process_overwrite_var.get(),
+                    workers=self._process_workers()
                 )
                 success_message = f"Обрезано: {stats['processed']} файлов\nОшибок: {stats['failed']}"
                 if stats.get('skipped', 0) > 0:
@@ -500,6 +508,13 @@ class DocumentScannerApp:
             self.progress_filename_var.set("")
             messagebox.showerror("Ошибка", f"Ошибка обработки: {str(e)}")
     
+    def _process_workers(self) -> int:
+        """Число процессов обработки из поля ввода (1 при некорректном значении)"""
+        try:
+            return max(1, min(int(self.process_workers_var.get()), os.cpu_count() or 1))
+        except (tk.TclError, ValueError):
+            return 1
+    
     def copy_images_without_cropping(self, input_folder, output_folder, progress_callback=None, overwrite=False):
         """
         Копирует изображения с применением сжатия JPEG (без обрезки)
@@ -827,9 +842,14 @@ class DocumentScannerApp:
         # Сохраняем с выбранным качеством сжатия
         jpeg_quality = self.manual_crop_compression_var.get()
         if self.manual_crop_manager.save_crop(str(output_path), jpeg_quality):
+            # Запись идет в фоне: сообщаем о предыдущих сохранениях, которые не удались
+            self._report_failed_saves()
+            
             # Переходим к следующему изображению
             result = self.manual_crop_manager.get_next_image()
             if result is None:
+                # Последнее сохранение могло еще не завершиться - дожидаемся перед итогом
+                self._report_failed_saves(wait=True)
                 messagebox.showinfo("Информация", "Все изображения обработаны!")
                 return
             
@@ -847,6 +867,13 @@ class DocumentScannerApp:
             self.manual_crop_status_var.set(f"Обработано: {current}/{total} | Текущее: {filename}")
         else:
             messagebox.showerror("Ошибка", "Не удалось сохранить изображение!")
+    
+    def _report_failed_saves(self, wait: bool = False):
+        """Показывает ошибку, если фоновые сохранения ручной обрезки не удались"""
+        failed = self.manual_crop_manager.pop_failed_saves(wait)
+        if failed:
+            names = "\n".join(path.name for path in failed)
+            messagebox.showerror("Ошибка", f"Не удалось сохранить изображения:\n{names}")
 
     def _normalize_filename(self, filename):
         """
@@ -1011,8 +1038,14 @@ class DocumentScannerApp:
         return corrupted_name
 
 def main():
+    # В собранном exe процессы пула process_folder запускают этот же exe:
+    # freeze_support выполняет в них задачу воркера вместо повторного запуска GUI
+    multiprocessing.freeze_support()
     app = DocumentScannerApp()
     app.root.mainloop()
+    # Дожидаемся фоновой записи последних ручных обрезок перед выходом
+    # (ошибки записи _write_crop уже напечатал, окна для сообщения больше нет)
+    app.manual_crop_manager.wait_for_saves()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,6 +4,8 @@ import random
 from pathlib import Path
 from typing import List, Tuple, Optional, Dict
 
+from utils.file_utils import get_jpeg_files_iter
+
 class CalibrationCell:
     """Одна ячейка калибровки для определенного формата документа"""
     def __init__(self):
@@ -536,11 +538,8 @@ class CalibrationManager:
         if not folder.exists():
             return False
             
-        # Ищем все JPEG файлы
-        extensions = ['*.jpg', '*.jpeg', '*.JPG', '*.JPEG']
-        self.image_paths = []
-        for ext in extensions:
-            self.image_paths.extend([str(p) for p in folder.glob(ext)])
+        # Ищем все JPEG файлы одним проходом по папке (без учета регистра расширения)
+        self.image_paths = [str(path) for path in get_jpeg_files_iter(folder)]
         
         if not self.image_paths:
             return False
@@ -17,8 +17,12 @@ class DocumentDetector:
         # Конвертация в grayscale
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
-        # Предобработка
-        blurred = cv2.GaussianBlur(gray, self.config.gaussian_blur_kernel, 0)
+        # Предобработка: blur_mode="box" - нормированный box-фильтр (SIMD в OpenCV),
+        # для сглаживания перед Canny практически равноценен Гауссу
+        if getattr(self.config, 'blur_mode', 'gaussian') == 'box':
+            blurred = cv2.boxFilter(gray, -1, self.config.gaussian_blur_kernel)
+        else:
+            blurred = cv2.GaussianBlur(gray, self.config.gaussian_blur_kernel, 0)
         edged = cv2.Canny(blurred, self.config.canny_threshold1, self.config.canny_threshold2)
         
         # Поиск контуров
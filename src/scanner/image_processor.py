@@ -1,9 +1,70 @@
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 import cv2
 import numpy as np
 from pathlib import Path
 from typing import Optional, List, Tuple
 
 from scanner.neural_detector import NeuralDocumentDetector
+from utils.image_io import read_image, write_image
+from utils.jit import njit
+
+# tqdm ограничивает частоту вывода прогресса; без него обрабатываем молча
+try:
+    from tqdm import tqdm
+    TQDM_AVAILABLE = True
+except ImportError:
+    TQDM_AVAILABLE = False
+
+def _report_error(message: str):
+    """Печатает ошибку обработки; при установленном tqdm - над полосой прогресса, не разрывая ее"""
+    if TQDM_AVAILABLE and sys.stdout is not None:
+        tqdm.write(message)
+    else:
+        print(message)
+
+# Форматы, которые process_folder берет из входной папки
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
+
+@njit(cache=True)
+def _quad_angles(pts: np.ndarray) -> np.ndarray:
+    """Углы четырехугольника (4, 2) в градусах, по одному на каждую вершину"""
+    angles = np.empty(4, dtype=np.float64)
+    for i in range(4):
+        j = (i + 1) % 4
+        k = (i + 2) % 4
+        v1x = pts[i, 0] - pts[j, 0]
+        v1y = pts[i, 1] - pts[j, 1]
+        v2x = pts[k, 0] - pts[j, 0]
+        v2y = pts[k, 1] - pts[j, 1]
+        norm = math.sqrt(v1x * v1x + v1y * v1y) * math.sqrt(v2x * v2x + v2y * v2y)
+        cos_angle = (v1x * v2x + v1y * v2y) / (norm + 1e-6)
+        cos_angle = min(1.0, max(-1.0, cos_angle))
+        angles[i] = math.acos(cos_angle) * 180.0 / math.pi
+    return angles
+
+@njit(cache=True)
+def _rect_angle_score(pts: np.ndarray) -> float:
+    """Оценка прямоугольности по углам: 1.0 для прямых углов, 0.0 при отклонении от 45 градусов"""
+    angles = _quad_angles(pts)
+    deviation = 0.0
+    for i in range(4):
+        deviation += abs(angles[i] - 90.0)
+    deviation /= 4.0
+    return max(0.0, 1.0 - deviation / 45.0)
+
+@lru_cache(maxsize=32)
+def _lab_color(bgr: Tuple[int, int, int]) -> np.ndarray:
+    """LAB-значение одного BGR-цвета; кэшируется, т.к. цвета калибровки фиксированы"""
+    lab = cv2.cvtColor(np.uint8([[bgr]]), cv2.COLOR_BGR2LAB)[0][0]
+    lab.setflags(write=False)
+    return lab
+
+def _to_lab(color) -> np.ndarray:
+    """Переводит цвет калибровки в LAB через кэш (ключ - значение цвета в uint8)"""
+    return _lab_color(tuple(np.uint8(color).tolist()))
 
 class ProcessingConfig:
     """Простая конфигурация обработки"""
@@ -13,10 +74,29 @@ class ProcessingConfig:
 class CalibratedImageProcessor:
     """Обработчик изображений с использованием параметров калибровки"""
     
+    # Структурные элементы для морфологии создаются один раз на класс
+    _K3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    _K5 = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+    _K7 = cv2.getStructuringElement(cv2.MORPH_RECT, (7, 7))
+    _K11 = cv2.getStructuringElement(cv2.MORPH_RECT, (11, 11))
+    _K15 = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+    _K25 = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 25))
+    
     def __init__(self, processing_config: ProcessingConfig, calibration_config):
         self.processing_config = processing_config
         self.calibration_config = calibration_config
         self.neural_detector = NeuralDocumentDetector()
+        # Буфер точек назначения для four_point_transform
+        self._dst_scratch = np.empty((4, 2), dtype=np.float32)
+        # T-API: при наличии OpenCL цепочка фильтров в _find_by_edges выполняется на GPU
+        self._use_opencl = cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+        # Подробный вывод хода поиска; process_folder отключает его на время пакетной обработки
+        self.verbose = True
+    
+    def _log(self, message: str):
+        """Печатает сообщение о ходе обработки, если включен подробный вывод"""
+        if self.verbose:
+            print(message)
     
     def _validate_points(self, points: np.ndarray, image_shape: Tuple[int, int]) -> Tuple[bool, str]:
         """
@@ -74,7 +154,7 @@ class CalibratedImageProcessor:
         
         # Если есть дубликаты, пробуем их исправить
         if len(unique_points) == 3:
-            print(f"      ⚠️ Обнаружено дублирование точек, исправляем...")
+            self._log(f"      ⚠️ Обнаружено дублирование точек, исправляем...")
             
             # Сортируем уникальные точки по углу от центра
             center = np.mean(unique_points, axis=0)
@@ -106,24 +186,24 @@ class CalibratedImageProcessor:
         
         # ========== ШАГ 1: НЕЙРОСЕТЬ ==========
         if self.neural_detector.is_available:
-            print("🧠 Пробуем нейросеть...")
+            self._log("🧠 Пробуем нейросеть...")
             
             # Логируем информацию об изображении
             h, w = image.shape[:2]
-            print(f"   Размер изображения: {w}x{h}")
-            print(f"   Соотношение сторон: {w/h:.2f}")
+            self._log(f"   Размер изображения: {w}x{h}")
+            self._log(f"   Соотношение сторон: {w/h:.2f}")
             
             # Пробуем нейросеть с разными порогами уверенности
             for conf in [0.7, 0.5, 0.3, 0.2, 0.1]:
-                print(f"   Пробуем порог уверенности: {conf}")
+                self._log(f"   Пробуем порог уверенности: {conf}")
                 
                 points = self.neural_detector.detect_document(image, conf_threshold=conf)
                 
                 if points is None:
-                    print(f"      ❌ Нет предсказаний (уверенность ниже {conf})")
+                    self._log(f"      ❌ Нет предсказаний (уверенность ниже {conf})")
                     continue
                 
-                print(f"      ✅ Получены точки: {points}")
+                self._log(f"      ✅ Получены точки: {points}")
                 
                 # Исправляем дубликаты
                 points = self._fix_duplicate_points(points)
@@ -133,72 +213,79 @@ class CalibratedImageProcessor:
                 
                 if is_valid:
                     contour = points.reshape(-1, 1, 2)
-                    print(f"   ✅ Документ найден нейросетью (уверенность: {conf})")
-                    print(f"   📍 Точки: {points.tolist()}")
+                    self._log(f"   ✅ Документ найден нейросетью (уверенность: {conf})")
+                    self._log(f"   📍 Точки: {points.tolist()}")
                     return contour
                 else:
-                    print(f"      ⚠️ Точки невалидны: {reason}")
-                    print(f"      📍 Полученные точки: {points.tolist()}")
+                    self._log(f"      ⚠️ Точки невалидны: {reason}")
+                    self._log(f"      📍 Полученные точки: {points.tolist()}")
                     continue
             
-            print("   ❌ Нейросеть не смогла найти валидный документ ни с одним порогом")
+            self._log("   ❌ Нейросеть не смогла найти валидный документ ни с одним порогом")
         else:
-            print("⚠️ Нейросеть недоступна (модель не загружена)")
-            print("   Проверьте наличие файла models/doc_detector.pt")
+            self._log("⚠️ Нейросеть недоступна (модель не загружена)")
+            self._log("   Проверьте наличие файла models/doc_detector.pt")
         
         # ========== ШАГ 2: ЭВРИСТИЧЕСКИЕ МЕТОДЫ (FALLBACK) ==========
-        print("⚠️ Переключаемся на эвристические методы...")
+        self._log("⚠️ Переключаемся на эвристические методы...")
+        
+        # Конвертируем в grayscale один раз и передаем во все методы
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Метод 0: Специальный метод для светлых документов на темном фоне
-        contour = self._find_light_on_dark(image)
+        contour = self._find_light_on_dark(image, gray)
         if contour is not None:
-            print("✅ Найден как светлый документ на темном фоне")
+            self._log("✅ Найден как светлый документ на темном фоне")
             return contour
         
         # Метод 0.5: Поиск краев документа
-        contour = self._find_document_edges(image)
+        contour = self._find_document_edges(image, gray)
         if contour is not None:
-            print("✅ Найден по краям документа")
+            self._log("✅ Найден по краям документа")
             return contour
         
         # Метод 1: Поиск по краям
-        contour = self._find_by_edges(image)
+        contour = self._find_by_edges(image, gray)
         if contour is not None:
-            print("✅ Найден по краям")
+            self._log("✅ Найден по краям")
             return contour
         
-        # Метод 2: Поиск по цвету
-        contour = self._find_by_color(image)
+        # Метод 2: Поиск по цвету (LAB нужен только если есть цвет калибровки)
+        image_lab = None
+        if self.calibration_config.avg_color is not None:
+            image_lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+        contour = self._find_by_color(image, image_lab)
         if contour is not None:
-            print("✅ Найден по цвету")
+            self._log("✅ Найден по цвету")
             return contour
         
         # Метод 3: Поиск по текстурам
-        contour = self._find_by_texture(image)
+        contour = self._find_by_texture(image, gray)
         if contour is not None:
-            print("✅ Найден по текстуре")
+            self._log("✅ Найден по текстуре")
             return contour
         
         # Метод 4: Ослабленные ограничения
-        print("⚠️ Попытка с ослабленными ограничениями...")
-        contour = self._find_with_relaxed_constraints(image)
+        self._log("⚠️ Попытка с ослабленными ограничениями...")
+        contour = self._find_with_relaxed_constraints(image, gray)
         if contour is not None:
-            print("✅ Найден с ослабленными ограничениями")
+            self._log("✅ Найден с ослабленными ограничениями")
             return contour
         
         # Метод 5: Любой большой прямоугольник
-        print("⚠️ Поиск любого большого прямоугольного контура...")
-        contour = self._find_any_large_rectangle(image)
+        self._log("⚠️ Поиск любого большого прямоугольного контура...")
+        contour = self._find_any_large_rectangle(image, gray)
         if contour is not None:
-            print("✅ Найден большой прямоугольный контур")
+            self._log("✅ Найден большой прямоугольный контур")
             return contour
         
-        print("❌ Документ не найден автоматически")
+        self._log("❌ Документ не найден автоматически")
         return None
     
-    def _find_light_on_dark(self, image: np.ndarray) -> Optional[np.ndarray]:
+    def _find_light_on_dark(self, image: np.ndarray, gray: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Специальный метод для поиска светлых документов на темном фоне, используя ВСЕ данные калибровки"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Пробуем несколько методов бинаризации
         binaries = []
@@ -239,16 +326,12 @@ class CalibratedImageProcessor:
         for binary in binaries:
             # Морфологические операции для улучшения маски
             # ВАЖНО: Более агрессивная обработка чтобы захватить весь документ, а не только текст
-            kernel_small = np.ones((3, 3), np.uint8)
-            kernel_medium = np.ones((7, 7), np.uint8)
-            kernel_large = np.ones((11, 11), np.uint8)
-            
             # Удаляем мелкий шум
-            binary_clean = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel_small, iterations=1)
+            binary_clean = cv2.morphologyEx(binary, cv2.MORPH_OPEN, self._K3, iterations=1)
             # Заполняем пробелы внутри документа (более агрессивно)
-            binary_clean = cv2.morphologyEx(binary_clean, cv2.MORPH_CLOSE, kernel_medium, iterations=4)
+            binary_clean = cv2.morphologyEx(binary_clean, cv2.MORPH_CLOSE, self._K7, iterations=4)
             # Расширяем чтобы захватить края документа и поля
-            binary_clean = cv2.dilate(binary_clean, kernel_large, iterations=3)
+            binary_clean = cv2.dilate(binary_clean, self._K11, iterations=3)
             
             # Сначала пробуем строгий режим
             contour = self._find_best_contour(binary_clean, image.shape, strict=True)
@@ -270,9 +353,10 @@ class CalibratedImageProcessor:
         
         return None
     
-    def _find_document_edges(self, image: np.ndarray) -> Optional[np.ndarray]:
+    def _find_document_edges(self, image: np.ndarray, gray: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Специальный метод для поиска краев документа (не текста, а краев бумаги)"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Используем информацию из калибровки о цвете документа
         if self.calibration_config.avg_color is not None and self.calibration_config.avg_bg_color is not None:
@@ -298,13 +382,10 @@ class CalibratedImageProcessor:
             _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
         
         # ОЧЕНЬ агрессивная морфологическая обработка чтобы захватить весь документ
-        kernel_medium = np.ones((15, 15), np.uint8)
-        kernel_large = np.ones((25, 25), np.uint8)
-        
         # Заполняем все пробелы внутри документа (включая пробелы между строками текста)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel_large, iterations=5)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self._K25, iterations=5)
         # Расширяем чтобы захватить края документа
-        binary = cv2.dilate(binary, kernel_medium, iterations=4)
+        binary = cv2.dilate(binary, self._K15, iterations=4)
         
         # Ищем контуры
         contour = self._find_best_contour(binary, image.shape, strict=True)
@@ -411,78 +492,55 @@ class CalibratedImageProcessor:
         except:
             return False
     
-    def _find_by_color(self, image: np.ndarray) -> Optional[np.ndarray]:
+    def _find_by_color(self, image: np.ndarray, image_lab: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Поиск документа по цвету используя ВСЮ расширенную информацию калибровки"""
         if self.calibration_config.avg_color is None:
             return None
         
         # Конвертируем в LAB цветовое пространство (более восприимчиво к изменениям освещения)
-        image_lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-        avg_color_lab = cv2.cvtColor(
-            np.uint8([[self.calibration_config.avg_color]]), 
-            cv2.COLOR_BGR2LAB
-        )[0][0]
+        if image_lab is None:
+            image_lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+        avg_color_lab = _to_lab(self.calibration_config.avg_color)
         
         # Используем расширенную информацию о цвете документа если доступна
         if self.calibration_config.document_color_std is not None:
             # Используем стандартное отклонение для более точного определения
-            color_std_lab = cv2.cvtColor(
-                np.uint8([[self.calibration_config.document_color_std]]), 
-                cv2.COLOR_BGR2LAB
-            )[0][0]
+            color_std_lab = _to_lab(self.calibration_config.document_color_std)
             # Используем 2.5 стандартных отклонения для диапазона
             threshold_range = np.linalg.norm(color_std_lab) * 2.5
         else:
             # Fallback на базовый порог из калибровки
             threshold_range = self.calibration_config.color_threshold * 1.5
         
-        # Вычисляем разницу в LAB пространстве (более точная метрика)
-        color_diff = np.linalg.norm(
-            image_lab.astype(np.float32) - avg_color_lab.astype(np.float32), 
-            axis=2
-        )
+        # Адаптивный порог с учетом расширенной информации
+        threshold = int(max(20, min(80, threshold_range)))
+        
+        # Вычисляем разницу в LAB пространстве (квадрат расстояния, без float)
+        color_dist2 = self._lab_sq_distance(image_lab, avg_color_lab)
+        document_mask = color_dist2 <= threshold * threshold
         
         # ДОПОЛНИТЕЛЬНО: Используем информацию о фоне для улучшения детекции
         # Исключаем области которые похожи на фон
         if self.calibration_config.avg_bg_color is not None and len(self.calibration_config.bg_samples) > 0:
             # Вычисляем разницу с фоном
-            avg_bg_color_lab = cv2.cvtColor(
-                np.uint8([[self.calibration_config.avg_bg_color]]), 
-                cv2.COLOR_BGR2LAB
-            )[0][0]
+            avg_bg_color_lab = _to_lab(self.calibration_config.avg_bg_color)
             
-            bg_diff = np.linalg.norm(
-                image_lab.astype(np.float32) - avg_bg_color_lab.astype(np.float32), 
-                axis=2
-            )
+            bg_dist2 = self._lab_sq_distance(image_lab, avg_bg_color_lab)
             
             # Если пиксель ближе к фону чем к документу, исключаем его
             bg_threshold = self.calibration_config.color_threshold * 0.8
-            bg_mask = bg_diff < bg_threshold
-            color_diff[bg_mask] = 255  # Помечаем как фон (будет исключено)
-        
-        # Адаптивный порог с учетом расширенной информации
-        threshold = max(20, min(80, threshold_range))
+            document_mask &= bg_dist2 >= bg_threshold * bg_threshold
         
         # Бинаризация
-        _, binary = cv2.threshold(
-            color_diff.astype(np.uint8), 
-            int(threshold), 
-            255, 
-            cv2.THRESH_BINARY_INV
-        )
+        binary = document_mask.view(np.uint8) * np.uint8(255)
         
         # Улучшенные морфологические операции (более агрессивные чтобы захватить весь документ)
-        kernel_small = np.ones((3, 3), np.uint8)
-        kernel_medium = np.ones((7, 7), np.uint8)
-        kernel_large = np.ones((11, 11), np.uint8)
-        
         # Удаляем шум
-        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel_small, iterations=1)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, self._K3, iterations=1)
         # Заполняем пробелы (более агрессивно)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel_large, iterations=3)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self._K11, iterations=3)
         # Расширяем чтобы захватить поля документа
-        binary = cv2.dilate(binary, kernel_medium, iterations=2)
+        binary = cv2.dilate(binary, self._K7, iterations=2)
         
         contour = self._find_best_contour(binary, image.shape, strict=True)
         if contour is not None:
@@ -491,12 +549,30 @@ class CalibratedImageProcessor:
                 return contour
         return None
     
-    def _find_by_edges(self, image: np.ndarray) -> Optional[np.ndarray]:
+    @staticmethod
+    def _lab_sq_distance(image_lab: np.ndarray, color_lab: np.ndarray) -> np.ndarray:
+        """Квадрат евклидова расстояния каждого пикселя до цвета в LAB (uint16 с насыщением)"""
+        color_image = np.empty_like(image_lab)
+        color_image[:] = color_lab
+        diff = cv2.absdiff(image_lab, color_image)
+        sq = cv2.multiply(diff, diff, dtype=cv2.CV_16U)
+        l_sq, a_sq, b_sq = cv2.split(sq)
+        # cv2.add насыщается на 65535 вместо переполнения - для порогов до 80 этого достаточно
+        return cv2.add(cv2.add(l_sq, a_sq), b_sq)
+    
+    def _find_by_edges(self, image: np.ndarray, gray: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Улучшенный поиск документа по краям"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        # С OpenCL промежуточные буферы (фильтр, Canny, морфология) остаются
+        # в памяти устройства, на CPU забираем только медиану и итоговые края
+        if self._use_opencl:
+            gray = cv2.UMat(gray)
         
         # Предобработка: уменьшаем шум
         gray = cv2.bilateralFilter(gray, 9, 75, 75)
+        gray_host = gray.get() if isinstance(gray, cv2.UMat) else gray
         
         # Пробуем несколько наборов параметров Canny для большей надежности
         edge_results = []
@@ -509,7 +585,7 @@ class CalibratedImageProcessor:
             edge_results.append(edges1)
         
         # Набор 2: Автоматический выбор порогов
-        median = np.median(gray)
+        median = np.median(gray_host)
         low_threshold = int(max(0, 0.7 * median))
         high_threshold = int(min(255, 1.3 * median))
         edges2 = cv2.Canny(gray, low_threshold, high_threshold)
@@ -528,9 +604,10 @@ class CalibratedImageProcessor:
         # Пробуем каждый набор краев
         for edges in edge_results:
             # Улучшаем края: соединяем близкие линии
-            kernel = np.ones((5, 5), np.uint8)
-            edges_processed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, iterations=2)
-            edges_processed = cv2.dilate(edges_processed, kernel, iterations=1)
+            edges_processed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, self._K5, iterations=2)
+            edges_processed = cv2.dilate(edges_processed, self._K5, iterations=1)
+            if isinstance(edges_processed, cv2.UMat):
+                edges_processed = edges_processed.get()
             
             contour = self._find_best_contour(edges_processed, image.shape, strict=True)
             if contour is not None:
@@ -541,9 +618,10 @@ class CalibratedImageProcessor:
         
         # Если ничего не нашли, пробуем с ослабленными ограничениями
         for edges in edge_results:
-            kernel = np.ones((7, 7), np.uint8)
-            edges_processed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, iterations=3)
-            edges_processed = cv2.dilate(edges_processed, kernel, iterations=2)
+            edges_processed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, self._K7, iterations=3)
+            edges_processed = cv2.dilate(edges_processed, self._K7, iterations=2)
+            if isinstance(edges_processed, cv2.UMat):
+                edges_processed = edges_processed.get()
             
             contour = self._find_best_contour(edges_processed, image.shape, strict=False)
             if contour is not None:
@@ -554,9 +632,10 @@ class CalibratedImageProcessor:
         
         return None
     
-    def _find_by_texture(self, image: np.ndarray) -> Optional[np.ndarray]:
+    def _find_by_texture(self, image: np.ndarray, gray: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Поиск документа по текстуре (для текстовых документов)"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Улучшенная предобработка
         gray = cv2.bilateralFilter(gray, 9, 75, 75)
@@ -570,9 +649,8 @@ class CalibratedImageProcessor:
         )
         
         # Морфологические операции для текстовых областей
-        kernel = np.ones((3, 3), np.uint8)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel, iterations=2)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=1)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self._K3, iterations=2)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, self._K3, iterations=1)
         
         contour = self._find_best_contour(binary, image.shape, strict=True)
         if contour is not None:
@@ -581,6 +659,18 @@ class CalibratedImageProcessor:
                 return contour
         return None
     
+    @staticmethod
+    def _contours_by_area(contours, limit: int) -> List[Tuple[np.ndarray, float]]:
+        """Возвращает до limit крупнейших контуров вместе с их площадью (от большего к меньшему)"""
+        if not contours:
+            return []
+        areas = np.fromiter((cv2.contourArea(c) for c in contours), dtype=np.float64, count=len(contours))
+        limit = min(limit, len(areas))
+        # Частичная сортировка O(N): полностью сортируем только limit крупнейших
+        top_idx = np.argpartition(-areas, limit - 1)[:limit]
+        top_idx = top_idx[np.argsort(-areas[top_idx], kind='stable')]
+        return [(contours[i], float(areas[i])) for i in top_idx]
+    
     def _find_best_contour(self, binary: np.ndarray, image_shape: Tuple[int, int], 
                           strict: bool = True, allow_vertical: bool = False) -> Optional[np.ndarray]:
         """Находит лучший контур удовлетворяющий параметрам калибровки
@@ -596,78 +686,43 @@ class CalibratedImageProcessor:
         if not contours:
             return None
         
-        # Сортируем контуры по площади (от большего к меньшему)
-        contours = sorted(contours, key=cv2.contourArea, reverse=True)
-        
         h, w = image_shape[:2]
         image_area = w * h
         best_contour = None
         best_score = -1  # Начинаем с -1 чтобы принимать контуры с score = 0
         
-        # Проверяем до 20 крупнейших контуров
-        for idx, contour in enumerate(contours[:20]):
-            area = cv2.contourArea(contour)
-            
+        # Проверяем до 20 крупнейших контуров (площадь считается один раз)
+        for contour, area in self._contours_by_area(contours, 20):
             # Минимальная площадь (хотя бы 2% изображения - очень мягкое требование)
             if area < image_area * 0.02:
                 continue
             
             area_ratio = area / image_area
+            perimeter = cv2.arcLength(contour, True)
             
-            # Пробуем разные epsilon для аппроксимации
-            found_valid_approx = False
+            # Один проход по возрастающему epsilon: число вершин с ростом epsilon
+            # только уменьшается, поэтому останавливаемся на первом подходящем
+            # четырехугольнике или когда вершин стало меньше 4
             approx = None
-            for eps_factor in [0.01, 0.015, 0.02, 0.03, 0.05]:
-                epsilon = eps_factor * cv2.arcLength(contour, True)
-                approx = cv2.approxPolyDP(contour, epsilon, True)
-                
-                # Нужно минимум 4 точки для прямоугольника
-                if len(approx) < 4:
+            for eps_factor in (0.01, 0.015, 0.02, 0.03, 0.05, 0.08, 0.1):
+                candidate = cv2.approxPolyDP(contour, eps_factor * perimeter, True)
+                if len(candidate) < 4:
+                    break
+                if len(candidate) > 4:
                     continue
                 
-                # Если больше 4 точек, пытаемся упростить
-                if len(approx) > 4:
-                    # Пробуем более агрессивное упрощение
-                    for eps_factor2 in [0.05, 0.08, 0.1]:
-                        epsilon2 = eps_factor2 * cv2.arcLength(contour, True)
-                        approx2 = cv2.approxPolyDP(contour, epsilon2, True)
-                        if len(approx2) == 4:
-                            approx = approx2
-                            break
-                    
-                    # Если все еще больше 4, берем первые 4 или используем выпуклую оболочку
-                    if len(approx) > 4:
-                        hull = cv2.convexHull(contour)
-                        if len(hull) >= 4:
-                            # Берем 4 точки из выпуклой оболочки
-                            if len(hull) == 4:
-                                approx = hull
-                            else:
-                                # Выбираем 4 точки с максимальными расстояниями
-                                approx = hull[:4]  # Просто берем первые 4
-                
                 # Проверяем выпуклость (более мягкая проверка)
-                try:
-                    is_convex = cv2.isContourConvex(approx)
-                    if not is_convex:
-                        # Проверяем solidity - если достаточно выпуклый, принимаем
-                        hull = cv2.convexHull(approx)
-                        hull_area = cv2.contourArea(hull)
-                        contour_area = cv2.contourArea(approx)
-                        if hull_area > 0:
-                            solidity = contour_area / hull_area
-                            if solidity < 0.85:  # Недостаточно выпуклый
-                                continue
-                except:
-                    # Если ошибка при проверке, пропускаем этот epsilon
-                    continue
+                if not cv2.isContourConvex(candidate):
+                    # Проверяем solidity - если достаточно выпуклый, принимаем
+                    hull_area = cv2.contourArea(cv2.convexHull(candidate))
+                    if hull_area > 0 and cv2.contourArea(candidate) / hull_area < 0.85:
+                        continue
                 
-                # Если дошли сюда, у нас есть валидный approx
-                found_valid_approx = True
-                break  # Выходим из цикла epsilon
+                approx = candidate
+                break
             
-            # Если не нашли валидный approx, пропускаем этот контур
-            if not found_valid_approx or approx is None:
+            # Если не нашли валидный четырехугольник, пропускаем этот контур
+            if approx is None:
                 continue
             
             # Вычисляем соотношение сторон для проверки
@@ -714,11 +769,8 @@ class CalibratedImageProcessor:
                 if aspect_ratio > max_aspect:
                     continue
             
-            # Оцениваем контур
+            # Оцениваем контур (aspect_ratio уже вычислен по minAreaRect выше)
             if strict:
-                rect = cv2.minAreaRect(approx)
-                width, height = rect[1]
-                aspect_ratio = max(width, height) / min(width, height)
                 score = self._score_contour(approx, area_ratio, aspect_ratio, image_area)
             else:
                 # Простая оценка для ослабленного режима
@@ -730,10 +782,11 @@ class CalibratedImageProcessor:
         
         return best_contour
     
-    def _find_with_relaxed_constraints(self, image: np.ndarray) -> Optional[np.ndarray]:
+    def _find_with_relaxed_constraints(self, image: np.ndarray, gray: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Поиск с ослабленными ограничениями калибровки"""
         # Пробуем все методы с ослабленными ограничениями
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         gray = cv2.bilateralFilter(gray, 9, 75, 75)
         
         # Адаптивный Canny
@@ -743,9 +796,8 @@ class CalibratedImageProcessor:
         edges = cv2.Canny(gray, low_threshold, high_threshold)
         
         # Более агрессивная обработка краев
-        kernel = np.ones((7, 7), np.uint8)
-        edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, iterations=3)
-        edges = cv2.dilate(edges, kernel, iterations=2)
+        edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, self._K7, iterations=3)
+        edges = cv2.dilate(edges, self._K7, iterations=2)
         
         contour = self._find_best_contour(edges, image.shape, strict=False)
         if contour is not None:
@@ -755,9 +807,10 @@ class CalibratedImageProcessor:
                 return contour
         return None
     
-    def _find_any_large_rectangle(self, image: np.ndarray) -> Optional[np.ndarray]:
+    def _find_any_large_rectangle(self, image: np.ndarray, gray: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Находит любой большой прямоугольный контур без ограничений калибровки"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Предобработка
         gray = cv2.bilateralFilter(gray, 9, 75, 75)
@@ -768,33 +821,31 @@ class CalibratedImageProcessor:
         # Множественные попытки с разными параметрами Canny
         for low, high in [(30, 100), (50, 150), (70, 200), (100, 250)]:
             edges = cv2.Canny(gray, low, high)
-            kernel = np.ones((5, 5), np.uint8)
-            edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, iterations=2)
-            edges = cv2.dilate(edges, kernel, iterations=1)
+            edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, self._K5, iterations=2)
+            edges = cv2.dilate(edges, self._K5, iterations=1)
             
             contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             if not contours:
                 continue
             
-            contours = sorted(contours, key=cv2.contourArea, reverse=True)
-            
             # Проверяем больше контуров (до 10)
-            for contour in contours[:10]:
-                area = cv2.contourArea(contour)
+            for contour, area in self._contours_by_area(contours, 10):
                 # Более мягкое требование к площади - минимум 5% изображения
                 if area < image_area * 0.05:
                     continue
                 
+                perimeter = cv2.arcLength(contour, True)
+                
                 # Пробуем разные epsilon для аппроксимации (более широкий диапазон)
                 for eps_factor in [0.01, 0.02, 0.03, 0.05, 0.08, 0.1]:
-                    epsilon = eps_factor * cv2.arcLength(contour, True)
+                    epsilon = eps_factor * perimeter
                     approx = cv2.approxPolyDP(contour, epsilon, True)
                     
                     # Принимаем контуры с 4 точками (идеально) или близкие к 4
                     if len(approx) >= 4:
                         # Если больше 4 точек, пытаемся упростить еще больше
                         if len(approx) > 4:
-                            epsilon = 0.1 * cv2.arcLength(contour, True)
+                            epsilon = 0.1 * perimeter
                             approx = cv2.approxPolyDP(contour, epsilon, True)
                             if len(approx) != 4:
                                 # Берем первые 4 точки если не удалось упростить
@@ -860,14 +911,11 @@ class CalibratedImageProcessor:
         # Если не нашли через края, пробуем через адаптивный порог
         binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                       cv2.THRESH_BINARY_INV, 15, 5)
-        kernel = np.ones((5, 5), np.uint8)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel, iterations=2)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self._K5, iterations=2)
         
         contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         if contours:
-            contours = sorted(contours, key=cv2.contourArea, reverse=True)
-            for contour in contours[:5]:
-                area = cv2.contourArea(contour)
+            for contour, area in self._contours_by_area(contours, 5):
                 if area < image_area * 0.05:
                     continue
                 
@@ -899,33 +947,20 @@ class CalibratedImageProcessor:
             area_diff = abs(area_ratio - target_area) / max(target_area, 0.01)
             score += max(0, 1.0 - area_diff * 2)  # Усиливаем важность соответствия
         
-        # Оценка по прямоугольности
-        hull = cv2.convexHull(contour)
-        hull_area = cv2.contourArea(hull)
+        # Оценка по прямоугольности (у выпуклого контура оболочка совпадает с ним самим)
         contour_area = cv2.contourArea(contour)
-        solidity = contour_area / hull_area if hull_area > 0 else 0
+        if cv2.isContourConvex(contour):
+            solidity = 1.0 if contour_area > 0 else 0
+        else:
+            hull_area = cv2.contourArea(cv2.convexHull(contour))
+            solidity = contour_area / hull_area if hull_area > 0 else 0
         score += solidity * 0.5  # До 0.5 баллов за прямоугольность
         
         # Оценка по углам (должны быть близки к 90 градусам)
         if len(contour) == 4:
             pts = contour.reshape(4, 2).astype(np.float32)
-            angles = []
-            for i in range(4):
-                p1 = pts[i]
-                p2 = pts[(i + 1) % 4]
-                p3 = pts[(i + 2) % 4]
-                
-                v1 = p1 - p2
-                v2 = p3 - p2
-                
-                cos_angle = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2) + 1e-6)
-                cos_angle = np.clip(cos_angle, -1, 1)
-                angle = np.arccos(cos_angle) * 180 / np.pi
-                angles.append(angle)
-            
-            # Среднее отклонение от 90 градусов
-            angle_deviation = np.mean([abs(a - 90) for a in angles])
-            angle_score = max(0, 1.0 - angle_deviation / 45)  # Идеально 90 градусов
+            # Среднее отклонение от 90 градусов (идеально 90 градусов)
+            angle_score = _rect_angle_score(pts)
             score += angle_score * 0.3
         
         # Бонус за размер (предпочитаем более крупные документы)
@@ -958,39 +993,39 @@ class CalibratedImageProcessor:
                     break
             
             if not valid:
-                print("⚠️  Найденный контур невалиден (точки слишком близки)")
+                self._log("⚠️  Найденный контур невалиден (точки слишком близки)")
                 contour = None  # Продолжаем к fallback
             
             if contour is not None:
                 # Просто обрезаем по прямоугольнику (без выравнивания перспективы)
-                result = self.rectangular_crop(image, contour_reshaped)
-                return result
+                return self.rectangular_crop(image, contour_reshaped)
+        
+        # Fallback: используем сохраненные точки калибровки если они есть
+        # (в том числе когда найденный контур оказался невалидным)
+        if (self.calibration_config.crop_points is not None and 
+            len(self.calibration_config.crop_points) == 4):
+            h, w = image.shape[:2]
+            points = [(int(x * w), int(y * h)) for x, y in self.calibration_config.crop_points]
+            points_array = np.array(points, dtype=np.float32)
+            
+            # Проверяем что точки находятся в пределах изображения
+            points_array[:, 0] = np.clip(points_array[:, 0], 0, w - 1)
+            points_array[:, 1] = np.clip(points_array[:, 1], 0, h - 1)
+            
+            self._log("⚠️  Используем сохраненные точки калибровки (адаптированные к размеру изображения)")
+            result = self.rectangular_crop(image, points_array)
+            return result
         else:
-            # Fallback: используем сохраненные точки калибровки если они есть
-            if (self.calibration_config.crop_points is not None and 
-                len(self.calibration_config.crop_points) == 4):
-                h, w = image.shape[:2]
-                points = [(int(x * w), int(y * h)) for x, y in self.calibration_config.crop_points]
-                points_array = np.array(points, dtype=np.float32)
-                
-                # Проверяем что точки находятся в пределах изображения
-                points_array[:, 0] = np.clip(points_array[:, 0], 0, w - 1)
-                points_array[:, 1] = np.clip(points_array[:, 1], 0, h - 1)
-                
-                print("⚠️  Используем сохраненные точки калибровки (адаптированные к размеру изображения)")
-                result = self.rectangular_crop(image, points_array)
+            # Последний fallback: пытаемся найти любой документ без калибровки
+            self._log("⚠️  Попытка найти документ без калибровки...")
+            contour = self._find_any_large_rectangle(image)
+            if contour is not None:
+                self._log("✅ Найден документ без калибровки")
+                result = self.rectangular_crop(image, contour.reshape(4, 2))
                 return result
             else:
-                # Последний fallback: пытаемся найти любой документ без калибровки
-                print("⚠️  Попытка найти документ без калибровки...")
-                contour = self._find_any_large_rectangle(image)
-                if contour is not None:
-                    print("✅ Найден документ без калибровки")
-                    result = self.rectangular_crop(image, contour.reshape(4, 2))
-                    return result
-                else:
-                    print("⚠️  Документ не найден, возвращаем оригинал")
-                    return image
+                self._log("⚠️  Документ не найден, возвращаем оригинал")
+                return image
     
     def rectangular_crop(self, image: np.ndarray, pts: np.ndarray) -> np.ndarray:
         """Обрезает изображение по прямоугольнику с отступами (без выравнивания перспективы)"""
@@ -1023,7 +1058,7 @@ class CalibratedImageProcessor:
         # Обрезаем изображение
         cropped = image[y_min:y_max, x_min:x_max]
         
-        print(f"📐 Обрезка: {width}x{height} -> {x_max-x_min}x{y_max-y_min} (отступ {margin_x}x{margin_y})")
+        self._log(f"📐 Обрезка: {width}x{height} -> {x_max-x_min}x{y_max-y_min} (отступ {margin_x}x{margin_y})")
         
         return cropped
     
@@ -1035,12 +1070,10 @@ class CalibratedImageProcessor:
         
         # ВЫЧИСЛЯЕМ размеры из найденных точек (не используем калибровку для размеров!)
         # Для трапеции берем МАКСИМАЛЬНЫЕ размеры чтобы ничего не обрезать
-        widthA = np.sqrt(((br[0] - bl[0]) ** 2) + ((br[1] - bl[1]) ** 2))
-        widthB = np.sqrt(((tr[0] - tl[0]) ** 2) + ((tr[1] - tl[1]) ** 2))
+        # Длины всех 4 сторон одной операцией: tl-tr, tr-br, br-bl, bl-tl
+        sides = np.linalg.norm(rect - np.roll(rect, -1, axis=0), axis=1)
+        widthB, heightA, widthA, heightB = sides
         maxWidth = max(int(widthA), int(widthB))
-        
-        heightA = np.sqrt(((tr[0] - br[0]) ** 2) + ((tr[1] - br[1]) ** 2))
-        heightB = np.sqrt(((tl[0] - bl[0]) ** 2) + ((tl[1] - bl[1]) ** 2))
         maxHeight = max(int(heightA), int(heightB))
         
         # Валидация: проверяем что размеры разумные (используем калибровку только для валидации)
@@ -1056,11 +1089,11 @@ class CalibratedImageProcessor:
             
             # Если соотношение сторон сильно отличается, возможно ошибка детекции
             if abs(aspect_ratio_calc - aspect_ratio_target) / aspect_ratio_target > 0.5:
-                print(f"⚠️  Предупреждение: соотношение сторон сильно отличается от калибровки ({aspect_ratio_calc:.2f} vs {aspect_ratio_target:.2f})")
+                self._log(f"⚠️  Предупреждение: соотношение сторон сильно отличается от калибровки ({aspect_ratio_calc:.2f} vs {aspect_ratio_target:.2f})")
         
         # Валидация размеров
         if maxWidth < 10 or maxHeight < 10:
-            print("⚠️  Слишком маленький размер, возвращаем оригинал")
+            self._log("⚠️  Слишком маленький размер, возвращаем оригинал")
             return image
         
         # Вычисляем отступ (2% от размера или минимум 15 пикселей для гарантии видимости фона)
@@ -1094,23 +1127,28 @@ class CalibratedImageProcessor:
         output_width = maxWidth + 2 * margin_x
         output_height = maxHeight + 2 * margin_y
         
-        print(f"📐 Вычислены размеры: {maxWidth}x{maxHeight}, выход: {output_width}x{output_height} (отступ {margin_x}x{margin_y})")
+        self._log(f"📐 Вычислены размеры: {maxWidth}x{maxHeight}, выход: {output_width}x{output_height} (отступ {margin_x}x{margin_y})")
         
-        # Формируем точки назначения для прямоугольника с отступом
-        dst = np.array([
-            [margin_x, margin_y],
-            [output_width - 1 - margin_x, margin_y],
-            [output_width - 1 - margin_x, output_height - 1 - margin_y],
-            [margin_x, output_height - 1 - margin_y]], dtype="float32")
+        # Формируем точки назначения для прямоугольника с отступом (в переиспользуемом буфере)
+        dst = self._dst_scratch
+        dst[0] = (margin_x, margin_y)
+        dst[1] = (output_width - 1 - margin_x, margin_y)
+        dst[2] = (output_width - 1 - margin_x, output_height - 1 - margin_y)
+        dst[3] = (margin_x, output_height - 1 - margin_y)
         
         # Вычисляем матрицу преобразования из расширенных точек
         M = cv2.getPerspectiveTransform(expanded_rect, dst)
         
-        # Применяем преобразование с улучшенной интерполяцией
+        # Интерполяцию выбираем по масштабу: при увеличении INTER_CUBIC резче,
+        # при уменьшении/1:1 достаточно INTER_LINEAR (INTER_AREA warpPerspective не поддерживает)
+        src_span = max(np.ptp(expanded_rect[:, 0]), np.ptp(expanded_rect[:, 1]))
+        dst_span = max(output_width, output_height)
+        interpolation = cv2.INTER_CUBIC if dst_span > src_span else cv2.INTER_LINEAR
+        
         # Используем BORDER_CONSTANT с белым фоном для областей вне документа
         warped = cv2.warpPerspective(
             image, M, (output_width, output_height),
-            flags=cv2.INTER_LINEAR,
+            flags=interpolation,
             borderMode=cv2.BORDER_CONSTANT,
             borderValue=(255, 255, 255)  # Белый фон
         )
@@ -1127,74 +1165,29 @@ class CalibratedImageProcessor:
         if pts.shape != (4, 2):
             pts = pts.reshape(4, 2)
         
-        rect = np.zeros((4, 2), dtype="float32")
-        
-        # Метод 1: сумма координат (top-left имеет наименьшую сумму, bottom-right - наибольшую)
-        s = pts.sum(axis=1)
-        rect[0] = pts[np.argmin(s)]  # top-left
-        rect[2] = pts[np.argmax(s)]  # bottom-right
-        
-        # Метод 2: разность координат (top-right имеет наименьшую разность, bottom-left - наибольшую)
-        diff = np.diff(pts, axis=1)
-        rect[1] = pts[np.argmin(diff)]  # top-right
-        rect[3] = pts[np.argmax(diff)]  # bottom-left
-        
-        # Валидация: проверяем что точки действительно образуют прямоугольник
-        # Вычисляем углы
-        def angle_between_points(p1, p2, p3):
-            """Вычисляет угол в точке p2"""
-            v1 = p1 - p2
-            v2 = p3 - p2
-            cos_angle = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2) + 1e-6)
-            cos_angle = np.clip(cos_angle, -1, 1)
-            return np.arccos(cos_angle) * 180 / np.pi
-        
-        # Проверяем углы (должны быть близки к 90 градусам)
-        angles = []
-        for i in range(4):
-            p1 = rect[i]
-            p2 = rect[(i + 1) % 4]
-            p3 = rect[(i + 2) % 4]
-            angles.append(angle_between_points(p1, p2, p3))
-        
-        avg_angle = np.mean(angles)
-        # Если средний угол сильно отличается от 90, возможно точки перепутаны
-        # В этом случае используем альтернативный метод
-        
-        if abs(avg_angle - 90) > 30:
-            # Альтернативный метод: сортировка по углу от центра
-            center = pts.mean(axis=0)
-            angles_from_center = []
-            for pt in pts:
-                angle = np.arctan2(pt[1] - center[1], pt[0] - center[0]) * 180 / np.pi
-                angles_from_center.append((angle, pt))
-            
-            # Сортируем по углу
-            angles_from_center.sort(key=lambda x: x[0])
-            sorted_pts = np.array([pt for _, pt in angles_from_center], dtype=np.float32)
-            
-            # Находим top-left (наименьшая сумма x+y)
-            s = sorted_pts.sum(axis=1)
-            top_left_idx = np.argmin(s)
-            
-            # Переупорядочиваем начиная с top-left
-            rect = np.roll(sorted_pts, -top_left_idx, axis=0)
+        # Сортируем вершины по углу от центра: для выпуклого четырехугольника
+        # (а других _find_best_contour не пропускает) это всегда обход по часовой
+        # стрелке в координатах изображения, затем начинаем обход с top-left
+        center = pts.mean(axis=0)
+        angles = np.arctan2(pts[:, 1] - center[1], pts[:, 0] - center[0])
+        sorted_pts = pts[np.argsort(angles)]
+        top_left_idx = np.argmin(sorted_pts.sum(axis=1))
         
-        return rect
+        return np.roll(sorted_pts, -top_left_idx, axis=0)
     
     def process_single_image(self, image_path: str) -> Optional[np.ndarray]:
         """Обрабатывает одно изображение используя калибровку"""
         try:
-            image = cv2.imread(image_path)
+            image = read_image(image_path)
             if image is None:
-                print(f"❌ Не удалось загрузить: {image_path}")
+                _report_error(f"❌ Не удалось загрузить: {image_path}")
                 return None
             
             return self.process_single_image_from_array(image, image_path)
             
         except Exception as e:
-            print(f"❌ Ошибка обработки {image_path}: {e}")
-            return cv2.imread(image_path)
+            _report_error(f"❌ Ошибка обработки {image_path}: {e}")
+            return None
     
     def process_single_image_from_array(self, image: np.ndarray, image_path: str = "") -> Optional[np.ndarray]:
         """Обрабатывает уже загруженное изображение используя калибровку"""
@@ -1211,17 +1204,18 @@ class CalibratedImageProcessor:
             compression = (result.shape[0] * result.shape[1]) / (image.shape[0] * image.shape[1])
             
             filename = Path(image_path).name if image_path else "изображение"
-            print(f"📄 {filename} {original_size} -> {new_size} ({compression*100:.1f}%)")
+            self._log(f"📄 {filename} {original_size} -> {new_size} ({compression*100:.1f}%)")
             
             return result
             
         except Exception as e:
             filename = Path(image_path).name if image_path else "изображение"
-            print(f"❌ Ошибка обработки {filename}: {e}")
+            _report_error(f"❌ Ошибка обработки {filename}: {e}")
             return image  # Возвращаем оригинал при ошибке
     
     def process_folder(self, input_folder: str, output_folder: str, 
-                      calibration_manager=None, progress_callback=None, overwrite=True) -> dict:
+                      calibration_manager=None, progress_callback=None, overwrite=True,
+                      workers: int = 1) -> dict:
         """Обрабатывает папку с изображениями используя калибровку
         
         Args:
@@ -1229,83 +1223,110 @@ class CalibratedImageProcessor:
             output_folder: Папка для сохранения результатов
             calibration_manager: Менеджер калибровки для выбора подходящей ячейки
             progress_callback: Функция для обновления прогресса (current, total, filename)
+            workers: Количество процессов (1 - обработка в текущем процессе)
         """
         input_path = Path(input_folder)
         output_path = Path(output_folder)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.JPG', '*.JPEG', '*.png', '*.PNG', '*.bmp', '*.BMP', '*.tiff', '*.TIFF']:
-            image_files.extend(input_path.glob(ext))
+        # Один проход по папке вместо glob на каждое расширение; суффикс сравниваем
+        # без учета регистра, чтобы на Windows *.jpg и *.JPG не давали дубликатов
+        image_files = [p for p in input_path.iterdir()
+                       if p.suffix.lower() in IMAGE_EXTENSIONS and p.is_file()]
         
         stats = {'total': len(image_files), 'processed': 0, 'failed': 0, 'skipped': 0}
         
         print(f"\n🎯 Обработка {len(image_files)} файлов с автоматическим обнаружением...")
         
-        for i, image_file in enumerate(image_files, 1):
-            # Обновляем прогресс
-            if progress_callback:
-                progress_callback(i, len(image_files), image_file.name)
-            
-            # Нормализуем имя файла как в manual_crop
-            original_filename = image_file.name
-            print(f"Оригинальное имя файла: {original_filename}")
-            
-            # Нормализуем имя файла
-            final_filename = original_filename
-            print(f"Финальное имя: {final_filename}")
-            
-            output_file = output_path / final_filename
-            
-            # Проверяем существование файла если перезапись отключена
+        # Пропускаем существующие результаты до любой работы с файлом
+        tasks = []
+        for image_file in image_files:
+            output_file = output_path / image_file.name
             if not overwrite and output_file.exists():
                 stats['skipped'] += 1
-                print(f"⏭️  {i:2d}/{len(image_files)}: {final_filename} (пропущен, файл существует)")
-                continue
-            
-            # Загружаем изображение один раз
-            image = cv2.imread(str(image_file))
-            if image is None:
-                stats['failed'] += 1
-                print(f"❌ {i:2d}/{len(image_files)}: {final_filename} (не удалось загрузить)")
                 continue
-            
-            # Если есть менеджер калибровки, выбираем подходящую ячейку для каждого изображения
-            old_config = None
-            if calibration_manager:
-                # Получаем подходящую калибровку
-                best_config = calibration_manager.get_best_calibration_for_image(image)
-                if best_config:
-                    # Временно заменяем калибровку
-                    old_config = self.calibration_config
-                    self.calibration_config = best_config
-            
-            # Убираем проверку существования - файлы будут перезаписываться
-            was_existing = output_file.exists()
-            
-            # Обрабатываем изображение (передаем уже загруженное)
-            result = self.process_single_image_from_array(image, str(image_file))
-            
-            # Восстанавливаем старую калибровку
-            if old_config is not None:
-                self.calibration_config = old_config
-            
-            if result is not None:
-                cv2.imwrite(str(output_file), result, [
-                    int(cv2.IMWRITE_JPEG_QUALITY), self.processing_config.jpeg_quality
-                ])
-                stats['processed'] += 1
-                if was_existing:
-                    print(f"✅ {i:2d}/{len(image_files)}: {final_filename} (перезаписан)")
-                else:
-                    print(f"✅ {i:2d}/{len(image_files)}: {final_filename}")
+            tasks.append((image_file, output_file))
+        
+        # Построчный print на каждый файл заметно тормозит на больших папках,
+        # поэтому прогресс выводим через tqdm, а печатаем только ошибки
+        # (в GUI-сборке без консоли sys.stderr равен None).
+        # Ход поиска по каждому файлу в пакетном режиме не печатаем
+        verbose, self.verbose = self.verbose, False
+        try:
+            progress_bar = None
+            if TQDM_AVAILABLE:
+                progress_bar = tqdm(total=len(tasks), desc='scan', unit='img', disable=sys.stderr is None)
+        
+            if workers > 1 and len(tasks) > 1:
+                # Процессор и калибровка создаются один раз на воркер, а не пиклятся с каждой задачей
+                executor = ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker,
+                    initargs=(self.processing_config, self.calibration_config, calibration_manager))
+                with executor:
+                    futures = {executor.submit(_run_worker, task): task[0] for task in tasks}
+                    results = ((futures[future], future) for future in as_completed(futures))
+                    for i, (image_file, future) in enumerate(results, stats['skipped'] + 1):
+                        if progress_callback:
+                            progress_callback(i, len(image_files), image_file.name)
+                        try:
+                            ok = future.result()
+                        except Exception as e:
+                            _report_error(f"❌ {image_file.name}: {e}")
+                            ok = False
+                        stats['processed' if ok else 'failed'] += 1
+                        if progress_bar is not None:
+                            progress_bar.update(1)
             else:
-                stats['failed'] += 1
-                print(f"❌ {i:2d}/{len(image_files)}: {final_filename}")
+                for i, (image_file, output_file) in enumerate(tasks, stats['skipped'] + 1):
+                    # Обновляем прогресс
+                    if progress_callback:
+                        progress_callback(i, len(image_files), image_file.name)
+                
+                    ok = self._process_file(image_file, output_file, calibration_manager)
+                    stats['processed' if ok else 'failed'] += 1
+                    if progress_bar is not None:
+                        progress_bar.update(1)
+        
+            if progress_bar is not None:
+                progress_bar.close()
+        finally:
+            self.verbose = verbose
         
         print(f"\n📊 Готово! Успешно: {stats['processed']}/{stats['total']}")
         return stats
 
+    def _process_file(self, image_file: Path, output_file: Path, calibration_manager=None) -> bool:
+        """Обрабатывает и сохраняет один файл, возвращает True при успехе"""
+        # Загружаем изображение один раз
+        image = read_image(image_file)
+        if image is None:
+            _report_error(f"❌ {image_file.name} (не удалось загрузить)")
+            return False
+        
+        # Если есть менеджер калибровки, выбираем подходящую ячейку для каждого изображения
+        old_config = None
+        if calibration_manager:
+            # Получаем подходящую калибровку
+            best_config = calibration_manager.get_best_calibration_for_image(image)
+            if best_config:
+                # Временно заменяем калибровку
+                old_config = self.calibration_config
+                self.calibration_config = best_config
+        
+        # Обрабатываем изображение (передаем уже загруженное)
+        result = self.process_single_image_from_array(image, str(image_file))
+        
+        # Восстанавливаем старую калибровку
+        if old_config is not None:
+            self.calibration_config = old_config
+        
+        if result is None:
+            _report_error(f"❌ {image_file.name}")
+            return False
+        
+        write_image(output_file, result, self.processing_config.jpeg_quality)
+        return True
+
     def _normalize_filename(self, filename):
         """
         Нормализует имя файла, оставляя только разрешенные символы
@@ -1468,3 +1489,19 @@ class CalibratedImageProcessor:
         
         return corrupted_name
 
+
+# Процессор воркера: создается один раз в каждом процессе пула process_folder
+_WORKER = None
+_WORKER_CALIBRATION_MANAGER = None
+
+def _init_worker(processing_config, calibration_config, calibration_manager):
+    """Инициализатор процесса пула: строит процессор один раз на воркер"""
+    global _WORKER, _WORKER_CALIBRATION_MANAGER
+    _WORKER = CalibratedImageProcessor(processing_config, calibration_config)
+    _WORKER.verbose = False
+    _WORKER_CALIBRATION_MANAGER = calibration_manager
+
+def _run_worker(task) -> bool:
+    """Обрабатывает одну пару (входной файл, выходной файл) в процессе пула"""
+    image_file, output_file = task
+    return _WORKER._process_file(image_file, output_file, _WORKER_CALIBRATION_MANAGER)
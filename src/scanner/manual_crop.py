@@ -1,15 +1,72 @@
 import cv2
+import heapq
 import numpy as np
 import random
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Optional, Dict
 from scanner.calibration import CalibrationConfig
 from scanner.image_processor import CalibratedImageProcessor
+from utils.file_utils import get_jpeg_files_iter
+from utils.image_io import read_image, write_image
+from utils.jit import NUMBA_AVAILABLE, njit
+
+@njit(cache=True)
+def _nearest_edge(pts: np.ndarray, x: float, y: float, threshold: float) -> int:
+    """Индекс ближайшей стороны четырехугольника (4, 2) в пределах threshold, иначе -1"""
+    best = -1
+    best_d2 = threshold * threshold
+    for i in range(4):
+        j = (i + 1) % 4
+        ax = float(pts[i, 0])
+        ay = float(pts[i, 1])
+        abx = float(pts[j, 0]) - ax
+        aby = float(pts[j, 1]) - ay
+        ab_sq = abx * abx + aby * aby
+        if ab_sq == 0.0:
+            continue  # Вырожденные стороны не учитываем
+        t = ((x - ax) * abx + (y - ay) * aby) / ab_sq
+        t = min(1.0, max(0.0, t))
+        dx = x - (ax + t * abx)
+        dy = y - (ay + t * aby)
+        d2 = dx * dx + dy * dy
+        if d2 <= best_d2 and (best < 0 or d2 < best_d2):
+            best = i
+            best_d2 = d2
+    return best
+
+@njit(cache=True)
+def _point_in_quad(pts: np.ndarray, x: float, y: float) -> int:
+    """1 - точка внутри выпуклого четырехугольника, 0 - снаружи, -1 - четырехугольник невыпуклый"""
+    turns_pos = False
+    turns_neg = False
+    side_pos = False
+    side_neg = False
+    for i in range(4):
+        j = (i + 1) % 4
+        k = (i + 2) % 4
+        ex = float(pts[j, 0] - pts[i, 0])
+        ey = float(pts[j, 1] - pts[i, 1])
+        turn = ex * float(pts[k, 1] - pts[j, 1]) - ey * float(pts[k, 0] - pts[j, 0])
+        turns_pos |= turn > 0.0
+        turns_neg |= turn < 0.0
+        d = (x - pts[i, 0]) * ey - (y - pts[i, 1]) * ex
+        side_pos |= d > 0.0
+        side_neg |= d < 0.0
+    if turns_pos and turns_neg:
+        return -1
+    return 0 if (side_pos and side_neg) else 1
 
 class ManualCropConfig:
     """Конфигурация для ручной обрезки с обучением на основе предыдущих обрезок"""
+    HISTORY_SIZE = 10  # Сколько последних образцов учитывается в предложенных точках
+    
     def __init__(self):
-        self.crop_points_history: List[List[Tuple[float, float]]] = []  # История точек в процентах
+        # История точек в процентах: кольцевой буфер (HISTORY_SIZE, 4, 2)
+        self._hist = np.empty((self.HISTORY_SIZE, 4, 2), dtype=np.float32)
+        self._head = 0
+        self._count = 0
         self.image_sizes_history: List[Tuple[int, int]] = []  # История размеров изображений
         self.samples_count = 0
         
@@ -17,52 +74,51 @@ class ManualCropConfig:
         """Добавляет образец обрезки для обучения"""
         w, h = image_size
         # Сохраняем точки в процентах
-        points_normalized = [(x / w, y / h) for x, y in points]
-        self.crop_points_history.append(points_normalized)
+        self._hist[self._head] = [(x / w, y / h) for x, y in points]
+        self._head = (self._head + 1) % self.HISTORY_SIZE
+        self._count = min(self._count + 1, self.HISTORY_SIZE)
         self.image_sizes_history.append(image_size)
         self.samples_count += 1
         
     def get_suggested_points(self, image_size: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
         """Получает предложенные точки на основе истории"""
-        if self.samples_count == 0:
+        if self._count == 0:
             return None
             
         w, h = image_size
         
-        # Вычисляем средние точки из истории
-        if len(self.crop_points_history) > 0:
-            # Берем последние несколько образцов (до 10) для более точных предсказаний
-            recent_samples = self.crop_points_history[-min(10, len(self.crop_points_history)):]
-            
-            # Вычисляем средние координаты
-            avg_points = []
-            for i in range(4):
-                x_coords = [sample[i][0] for sample in recent_samples]
-                y_coords = [sample[i][1] for sample in recent_samples]
-                
-                # Используем медиану для большей устойчивости к выбросам
-                avg_x = np.median(x_coords)
-                avg_y = np.median(y_coords)
-                
-                avg_points.append((int(avg_x * w), int(avg_y * h)))
-            
-            return avg_points
+        # Буфер хранит последние HISTORY_SIZE образцов; порядок для медианы не важен,
+        # поэтому берем срез без копирования
+        recent_samples = self._hist[:self._count]  # (N, 4, 2)
         
-        return None
+        # Используем медиану для большей устойчивости к выбросам - одна операция на все углы
+        median_points = np.median(recent_samples, axis=0)  # (4, 2)
+        scaled = (median_points * np.array([w, h], dtype=np.float32)).astype(np.int32)
+        
+        return list(map(tuple, scaled.tolist()))
 
 class ManualCropManager:
     """Менеджер для ручной обрезки с интерактивными точками"""
+    PREVIEW_CACHE_SIZE = 8  # Сколько последних декодированных превью держать в памяти
+    PREVIEW_REDUCTION = 2  # Во сколько раз превью меньше оригинала
+    DISPLAY_MAX_SIZE = 1600  # Большая сторона кадра, на котором рисуется разметка
+    # Зоны захвата задавались в пикселях оригинала, точки же хранятся в координатах превью
+    POINT_GRAB_RADIUS = 40 // PREVIEW_REDUCTION
+    EDGE_GRAB_DISTANCE = 20 // PREVIEW_REDUCTION
     
     def __init__(self, manual_crop_config: ManualCropConfig, calibration_config: Optional[CalibrationConfig] = None, calibration_manager=None):
         self.config = manual_crop_config
         self.calibration_config = calibration_config
         self.calibration_manager = calibration_manager  # Менеджер калибровки для работы с ячейками
-        self.current_points: List[Tuple[int, int]] = []
-        self.current_image: Optional[np.ndarray] = None
+        self._cpts = np.empty((0, 2), dtype=np.int32)  # Точки обрезки (N, 2), N <= 4
+        self.current_image: Optional[np.ndarray] = None  # Уменьшенное превью для показа и разметки
+        self.current_image_path: Optional[str] = None
         self.image_paths: List[str] = []
         self.current_index = 0
         self.saved_indices: set = set()  # Индексы сохраненных изображений
         self.skipped_indices: set = set()  # Индексы пропущенных изображений
+        self._skipped_heap: List[int] = []  # Те же индексы в куче для выдачи по порядку
+        self._processed = np.zeros(0, dtype=bool)  # Маска: сохранено или пропущено
         self.dragging_point_index: Optional[int] = None
         self.hover_point_index: Optional[int] = None
         self.dragging_area: bool = False
@@ -70,6 +126,31 @@ class ManualCropManager:
         self.dragging_edge: Optional[int] = None  # Индекс стороны для перетаскивания (0-3)
         self.drag_edge_offset: Optional[Tuple[int, int]] = None  # Перпендикулярное смещение для перетаскивания стороны
         self.drag_start_mouse_pos: Optional[Tuple[int, int]] = None  # Начальная позиция мыши при перетаскивании стороны
+        self._edge_perp: Optional[np.ndarray] = None  # Нормаль к перетаскиваемой стороне
+        # Фоновое чтение следующего изображения, пока пользователь размечает текущее
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._prefetch: Optional[Future] = None
+        self._prefetch_index: Optional[int] = None
+        self._pending_saves: List[Tuple[Path, Future]] = []  # Фоновые записи save_crop, результат которых еще не проверен
+        self._failed_saves: List[Path] = []  # Файлы, которые не удалось записать
+        # LRU-кэш превью по пути файла (меняется только из UI-потока)
+        self._img_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Переиспользуемый холст для get_annotated_image
+        self._canvas: Optional[np.ndarray] = None
+        # Кадр экранного размера для разметки и его масштаб относительно превью
+        self._display: Optional[np.ndarray] = None
+        self._display_scale = 1.0
+        # Ключ состояния, по которому был нарисован текущий холст
+        self._anno_key: Optional[tuple] = None
+    
+    @property
+    def current_points(self) -> List[Tuple[int, int]]:
+        """Текущие точки обрезки списком кортежей (внутри хранятся массивом int32)"""
+        return list(map(tuple, self._cpts.tolist()))
+    
+    @current_points.setter
+    def current_points(self, points: List[Tuple[int, int]]):
+        self._cpts = np.array(points, dtype=np.int32).reshape(-1, 2)
         
     def load_images_from_folder(self, folder_path: str) -> bool:
         """Загружает изображения из папки для ручной обрезки"""
@@ -77,11 +158,8 @@ class ManualCropManager:
         if not folder.exists():
             return False
             
-        # Ищем все JPEG файлы
-        extensions = ['*.jpg', '*.jpeg', '*.JPG', '*.JPEG']
-        self.image_paths = []
-        for ext in extensions:
-            self.image_paths.extend([str(p) for p in folder.glob(ext)])
+        # Ищем все JPEG файлы одним проходом по папке (без учета регистра расширения)
+        self.image_paths = [str(path) for path in get_jpeg_files_iter(folder)]
         
         if not self.image_paths:
             return False
@@ -91,39 +169,109 @@ class ManualCropManager:
         self.current_index = 0
         self.saved_indices = set()
         self.skipped_indices = set()
+        self._skipped_heap = []
+        self._processed = np.zeros(len(self.image_paths), dtype=bool)
+        self._prefetch = None  # Индекс предзагрузки относился к прежнему списку
+        self._prefetch_index = None
         
         print(f"📁 Загружено {len(self.image_paths)} изображений для ручной обрезки")
         return True
     
+    def _load_preview(self, image_path: str) -> Optional[np.ndarray]:
+        """Читает изображение для экрана в уменьшенном разрешении (DCT-масштабирование libjpeg)"""
+        return read_image(image_path, reduce=self.PREVIEW_REDUCTION)
+    
+    def _get_preview(self, image_path: str) -> Optional[np.ndarray]:
+        """Превью из кэша или с диска (повторные визиты к пропущенным/предыдущим без декодирования)"""
+        image = self._img_cache.get(image_path)
+        if image is not None:
+            self._img_cache.move_to_end(image_path)
+            return image
+        image = self._load_preview(image_path)
+        self._cache_preview(image_path, image)
+        return image
+    
+    def _cache_preview(self, image_path: str, image: Optional[np.ndarray]):
+        """Кладет превью в LRU-кэш, вытесняя самое давнее"""
+        if image is None:
+            return
+        self._img_cache[image_path] = image
+        self._img_cache.move_to_end(image_path)
+        if len(self._img_cache) > self.PREVIEW_CACHE_SIZE:
+            self._img_cache.popitem(last=False)
+    
+    @staticmethod
+    def _rescale_points(pts: np.ndarray, src_shape: Tuple[int, ...], dst_shape: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        """Пересчитывает точки (N, 2) из изображения размера src_shape в изображение размера dst_shape"""
+        # Масштаб берем по фактическим размерам: при нечетных сторонах он не ровно 2
+        sh, sw = src_shape[:2]
+        dh, dw = dst_shape[:2]
+        scaled = np.rint(np.asarray(pts, dtype=np.float32) * np.array([dw / sw, dh / sh], dtype=np.float32)).astype(np.int32)
+        np.clip(scaled, 0, [dw - 1, dh - 1], out=scaled)
+        return list(map(tuple, scaled.tolist()))
+    
+    def _full_resolution(self) -> Tuple[Optional[np.ndarray], List[Tuple[int, int]]]:
+        """Полноразмерное текущее изображение и точки, пересчитанные из координат превью"""
+        image = read_image(self.current_image_path)
+        if image is None:
+            return None, []
+        return image, self._rescale_points(self._cpts, self.current_image.shape, image.shape)
+    
+    def _next_unprocessed(self, start: int) -> int:
+        """Первый индекс >= start, который не сохранен и не пропущен (len(image_paths) если таких нет)"""
+        rest = self._processed[start:]
+        if rest.size == 0:
+            return len(self.image_paths)
+        offset = int(np.argmin(rest))  # Первый False в маске
+        return start + offset if not rest[offset] else len(self.image_paths)
+    
+    def _start_prefetch(self):
+        """Запускает фоновое чтение изображения, которое get_next_image покажет следующим"""
+        next_index = self._next_unprocessed(self.current_index + 1)
+        if next_index < len(self.image_paths) and self.image_paths[next_index] not in self._img_cache:
+            self._prefetch_index = next_index
+            self._prefetch = self._pool.submit(self._load_preview, self.image_paths[next_index])
+    
     def get_next_image(self) -> Optional[Tuple[np.ndarray, str]]:
         """Возвращает следующее изображение для обрезки"""
         # Сначала ищем непропущенные изображения
-        while self.current_index < len(self.image_paths):
-            if self.current_index not in self.saved_indices and self.current_index not in self.skipped_indices:
-                break
-            self.current_index += 1
+        self.current_index = self._next_unprocessed(self.current_index)
         
         # Если все обработаны, показываем пропущенные
         if self.current_index >= len(self.image_paths):
+            # Показываем пропущенные по порядку: наименьший индекс берем из кучи,
+            # а не сортируем все пропущенные на каждом переходе
+            while self._skipped_heap and self._skipped_heap[0] not in self.skipped_indices:
+                heapq.heappop(self._skipped_heap)
             if self.skipped_indices:
-                # Показываем пропущенные по порядку
-                skipped_list = sorted(list(self.skipped_indices))
-                if skipped_list:
-                    self.current_index = skipped_list[0]
+                if self._skipped_heap:
+                    self.current_index = heapq.heappop(self._skipped_heap)
                     self.skipped_indices.remove(self.current_index)
+                    self._processed[self.current_index] = self.current_index in self.saved_indices
                 else:
                     return None
             else:
                 return None
         
         image_path = self.image_paths[self.current_index]
-        image = cv2.imread(image_path)
+        if self._prefetch is not None and self._prefetch_index == self.current_index:
+            # Изображение уже читается в фоне - дожидаемся его вместо повторного чтения
+            image = self._prefetch.result()
+            self._cache_preview(image_path, image)
+        else:
+            image = self._get_preview(image_path)
+        self._prefetch = None
+        self._prefetch_index = None
         
         if image is None:
             self.current_index += 1
             return self.get_next_image()  # Пробуем следующее
             
         self.current_image = image
+        self.current_image_path = image_path
+        self._anno_key = None
+        self._display = None
+        self._start_prefetch()
         self.current_points = []
         self.dragging_point_index = None
         self.hover_point_index = None
@@ -139,7 +287,10 @@ class ManualCropManager:
     def skip_current_image(self):
         """Пропускает текущее изображение без сохранения"""
         if self.current_index < len(self.image_paths):
-            self.skipped_indices.add(self.current_index)
+            if self.current_index not in self.skipped_indices:
+                self.skipped_indices.add(self.current_index)
+                heapq.heappush(self._skipped_heap, self.current_index)
+            self._processed[self.current_index] = True
             self.current_index += 1
     
     def get_previous_image(self) -> Optional[Tuple[np.ndarray, str]]:
@@ -154,13 +305,16 @@ class ManualCropManager:
             if prev_index not in self.saved_indices:
                 self.current_index = prev_index
                 image_path = self.image_paths[self.current_index]
-                image = cv2.imread(image_path)
+                image = self._get_preview(image_path)
                 
                 if image is None:
                     prev_index -= 1
                     continue
                 
                 self.current_image = image
+                self.current_image_path = image_path
+                self._anno_key = None
+                self._display = None
                 self.current_points = []
                 self.dragging_point_index = None
                 self.hover_point_index = None
@@ -180,25 +334,26 @@ class ManualCropManager:
         if self.current_image is None:
             return False
             
-        if len(self.current_points) >= 4:
+        if len(self._cpts) >= 4:
             return False
             
-        self.current_points.append((x, y))
+        self._cpts = np.concatenate([self._cpts, np.array([[x, y]], dtype=np.int32)])
         return True
     
     def set_points(self, points: List[Tuple[int, int]]):
         """Устанавливает все 4 точки сразу"""
         if len(points) == 4:
-            self.current_points = points.copy()
+            self.current_points = points
     
     def remove_last_point(self):
         """Удаляет последнюю добавленную точку"""
-        if self.current_points:
-            self.current_points.pop()
+        if len(self._cpts):
+            self._cpts = self._cpts[:-1]
     
     def clear_points(self):
         """Очищает все точки"""
         self.current_points = []
+        self._anno_key = None
         self.dragging_point_index = None
         self.hover_point_index = None
         self.dragging_area = False
@@ -209,65 +364,67 @@ class ManualCropManager:
     
     def is_point_inside_area(self, x: int, y: int) -> bool:
         """Проверяет находится ли точка внутри выделенной области"""
-        if len(self.current_points) != 4:
+        if len(self._cpts) != 4:
             return False
         
-        # Используем алгоритм ray casting для проверки точки внутри многоугольника
-        points = np.array(self.current_points, dtype=np.int32)
-        return cv2.pointPolygonTest(points, (x, y), False) >= 0
+        pts = self._cpts
+        if NUMBA_AVAILABLE:
+            inside = _point_in_quad(pts, float(x), float(y))
+            if inside >= 0:
+                return inside == 1
+            return cv2.pointPolygonTest(pts, (x, y), False) >= 0
+        
+        edges = np.roll(pts, -1, axis=0) - pts
+        
+        # Для выпуклого четырехугольника точка внутри, если она по одну сторону от всех сторон
+        # (знаки векторных произведений совпадают, ноль - на границе)
+        turns = edges[:, 0] * np.roll(edges[:, 1], -1) - edges[:, 1] * np.roll(edges[:, 0], -1)
+        if (turns >= 0).all() or (turns <= 0).all():
+            d = (x - pts[:, 0]) * edges[:, 1] - (y - pts[:, 1]) * edges[:, 0]
+            return bool((d >= 0).all() or (d <= 0).all())
+        
+        # Невыпуклую область (точки расставлены вручную) проверяем общим тестом OpenCV
+        return cv2.pointPolygonTest(pts, (x, y), False) >= 0
     
-    def find_nearest_edge(self, x: int, y: int, threshold: int = 20) -> Optional[int]:
+    def find_nearest_edge(self, x: int, y: int, threshold: int = EDGE_GRAB_DISTANCE) -> Optional[int]:
         """Находит ближайшую сторону области"""
-        if len(self.current_points) != 4:
+        if len(self._cpts) != 4:
             return None
         
-        min_distance = float('inf')
-        nearest_edge = None
+        if NUMBA_AVAILABLE:
+            nearest_edge = _nearest_edge(self._cpts, float(x), float(y), float(threshold))
+            return nearest_edge if nearest_edge >= 0 else None
         
-        for i in range(4):
-            p1 = self.current_points[i]
-            p2 = self.current_points[(i + 1) % 4]
-            
-            # Вычисляем расстояние от точки до отрезка
-            # Используем формулу расстояния от точки до отрезка
-            A = np.array([p1[0], p1[1]], dtype=np.float32)
-            B = np.array([p2[0], p2[1]], dtype=np.float32)
-            P = np.array([x, y], dtype=np.float32)
-            
-            # Вектор AB
-            AB = B - A
-            # Вектор AP
-            AP = P - A
-            
-            # Проекция AP на AB
-            ab_sq = np.dot(AB, AB)
-            if ab_sq == 0:
-                continue
-            
-            t = np.clip(np.dot(AP, AB) / ab_sq, 0.0, 1.0)
-            
-            # Ближайшая точка на отрезке
-            closest = A + t * AB
-            
-            # Расстояние от P до ближайшей точки на отрезке
-            distance = np.linalg.norm(P - closest)
-            
-            if distance < min_distance and distance <= threshold:
-                min_distance = distance
-                nearest_edge = i
+        # Без numba - расстояние от точки до всех 4 отрезков сразу: сторона i идет от A[i] к B[i]
+        A = self._cpts.astype(np.float32)
+        B = np.roll(A, -1, axis=0)
+        P = np.array([x, y], dtype=np.float32)
         
-        return nearest_edge
+        AB = B - A
+        AP = P - A
+        
+        # Проекция AP на AB, параметр t ограничен отрезком
+        ab_sq = (AB * AB).sum(axis=1)
+        t = np.clip((AP * AB).sum(axis=1) / np.maximum(ab_sq, 1e-9), 0.0, 1.0)
+        
+        # Ближайшие точки на отрезках и расстояния до них
+        closest = A + t[:, None] * AB
+        distances = np.linalg.norm(P - closest, axis=1)
+        distances[ab_sq == 0] = np.inf  # Вырожденные стороны не учитываем
+        
+        nearest_edge = int(np.argmin(distances))
+        return nearest_edge if distances[nearest_edge] <= threshold else None
     
     def start_edge_drag(self, x: int, y: int) -> bool:
         """Начинает перетаскивание стороны"""
-        if len(self.current_points) != 4:
+        if len(self._cpts) != 4:
             return False
         
         edge_idx = self.find_nearest_edge(x, y)
         if edge_idx is not None:
             # Вычисляем смещение от точки клика до ближайшей точки на стороне
-            p1 = self.current_points[edge_idx]
-            p2 = self.current_points[(edge_idx + 1) % 4]
+            p1 = self._cpts[edge_idx]
+            p2 = self._cpts[(edge_idx + 1) % 4]
             
             A = np.array([p1[0], p1[1]], dtype=np.float32)
             B = np.array([p2[0], p2[1]], dtype=np.float32)
@@ -283,8 +440,11 @@ class ManualCropManager:
                 # Сохраняем расстояние от точки клика до стороны (перпендикулярное расстояние)
                 perp_vector = P - closest
                 self.drag_edge_offset = (int(perp_vector[0]), int(perp_vector[1]))
+                # Единичная нормаль к стороне (поворот на 90 градусов) на всё перетаскивание
+                self._edge_perp = np.array([-AB[1], AB[0]], dtype=np.float32) / np.sqrt(ab_sq)
             else:
                 self.drag_edge_offset = (0, 0)
+                self._edge_perp = None
             
             # Сохраняем начальную позицию мыши для отслеживания смещения
             self.drag_start_mouse_pos = (x, y)
@@ -295,26 +455,28 @@ class ManualCropManager:
     
     def start_area_drag(self, x: int, y: int) -> bool:
         """Начинает перетаскивание всей области"""
-        if len(self.current_points) != 4:
+        if len(self._cpts) != 4:
             return False
         
         if not self.is_point_inside_area(x, y):
             return False
         
         # Вычисляем центр области
-        points_array = np.array(self.current_points, dtype=np.float32)
-        center = np.mean(points_array, axis=0)
+        center = np.mean(self._cpts, axis=0)
         
         # Сохраняем смещение от точки клика до центра
         self.drag_start_offset = (int(x - center[0]), int(y - center[1]))
         self.dragging_area = True
         return True
     
-    def find_point_at(self, x: int, y: int, threshold: int = 40) -> Optional[int]:
+    def find_point_at(self, x: int, y: int, threshold: int = POINT_GRAB_RADIUS) -> Optional[int]:
         """Находит точку рядом с указанными координатами"""
-        for i, (px, py) in enumerate(self.current_points):
-            distance = np.sqrt((x - px)**2 + (y - py)**2)
-            if distance <= threshold:
+        # Сравниваем квадраты расстояний: без sqrt и numpy для скалярной арифметики
+        threshold_sq = threshold * threshold
+        for i, (px, py) in enumerate(self._cpts.tolist()):
+            dx = x - px
+            dy = y - py
+            if dx * dx + dy * dy <= threshold_sq:
                 return i
         return None
     
@@ -327,7 +489,7 @@ class ManualCropManager:
             return True
         
         # Затем проверяем перетаскивание стороны
-        if len(self.current_points) == 4 and self.start_edge_drag(x, y):
+        if len(self._cpts) == 4 and self.start_edge_drag(x, y):
             return True
         
         # Если не попали в точку или сторону, проверяем перетаскивание области
@@ -347,67 +509,33 @@ class ManualCropManager:
             # Перетаскивание отдельной точки
             x = max(0, min(x, w - 1))
             y = max(0, min(y, h - 1))
-            self.current_points[self.dragging_point_index] = (x, y)
+            self._cpts[self.dragging_point_index] = (x, y)
         elif self.dragging_edge is not None and self.drag_start_mouse_pos is not None:
             # Перетаскивание стороны - двигаем перпендикулярно направлению стороны
             edge_idx = self.dragging_edge
-            p1 = self.current_points[edge_idx]
-            p2 = self.current_points[(edge_idx + 1) % 4]
+            p1 = self._cpts[edge_idx]
+            p2 = self._cpts[(edge_idx + 1) % 4]
             
-            # Вычисляем направление стороны
-            A = np.array([p1[0], p1[1]], dtype=np.float32)
-            B = np.array([p2[0], p2[1]], dtype=np.float32)
-            AB = B - A
-            ab_len = np.linalg.norm(AB)
+            # Нормаль к стороне вычислена один раз в start_edge_drag: обе точки стороны
+            # сдвигаются на один вектор, поэтому направление стороны не меняется
+            perp_norm = self._edge_perp
             
-            if ab_len > 0:
-                # Нормализованный вектор стороны
-                AB_norm = AB / ab_len
-                
-                # Перпендикулярный вектор (поворот на 90 градусов)
-                perp_norm = np.array([-AB_norm[1], AB_norm[0]], dtype=np.float32)
-                
-                # Вычисляем текущую позицию курсора
-                current_mouse = np.array([x, y], dtype=np.float32)
-                
-                # Находим ближайшую точку на стороне к начальной позиции мыши
+            if perp_norm is not None:
+                # Смещение стороны - разница перпендикулярных расстояний от курсора до стороны;
+                # общая точка стороны при вычитании сокращается, остается проекция сдвига мыши на нормаль
                 start_x, start_y = self.drag_start_mouse_pos
-                start_mouse = np.array([start_x, start_y], dtype=np.float32)
-                
-                # Проекция начальной позиции мыши на сторону
-                AP_start = start_mouse - A
-                t_start = np.clip(np.dot(AP_start, AB_norm) / ab_len, 0.0, 1.0)
-                closest_start = A + t_start * AB
-                
-                # Перпендикулярное расстояние от начальной позиции мыши до стороны
-                perp_dist_start = np.dot(start_mouse - closest_start, perp_norm)
-                
-                # Проекция текущей позиции мыши на сторону
-                AP_current = current_mouse - A
-                t_current = np.clip(np.dot(AP_current, AB_norm) / ab_len, 0.0, 1.0)
-                closest_current = A + t_current * AB
-                
-                # Перпендикулярное расстояние от текущей позиции мыши до стороны
-                perp_dist_current = np.dot(current_mouse - closest_current, perp_norm)
-                
-                # Вычисляем смещение стороны (разница перпендикулярных расстояний)
-                perp_displacement = perp_dist_current - perp_dist_start
+                perp_displacement = (x - start_x) * perp_norm[0] + (y - start_y) * perp_norm[1]
                 
                 # Применяем смещение к обеим точкам стороны в перпендикулярном направлении
                 displacement_vector = perp_norm * perp_displacement
                 
-                new_p1 = (int(p1[0] + displacement_vector[0]), int(p1[1] + displacement_vector[1]))
-                new_p2 = (int(p2[0] + displacement_vector[0]), int(p2[1] + displacement_vector[1]))
-                
-                # Ограничиваем координаты
-                new_p1 = (max(0, min(new_p1[0], w - 1)), max(0, min(new_p1[1], h - 1)))
-                new_p2 = (max(0, min(new_p2[0], w - 1)), max(0, min(new_p2[1], h - 1)))
+                # Сдвигаем и ограничиваем обе точки стороны одной операцией
+                ends = (np.array([p1, p2], dtype=np.float32) + displacement_vector).astype(np.int32)
+                np.clip(ends, 0, [w - 1, h - 1], out=ends)
                 
                 # Обновляем точки
-                new_points = list(self.current_points)
-                new_points[edge_idx] = new_p1
-                new_points[(edge_idx + 1) % 4] = new_p2
-                self.current_points = new_points
+                self._cpts[edge_idx] = ends[0]
+                self._cpts[(edge_idx + 1) % 4] = ends[1]
                 
                 # Обновляем начальную позицию мыши для следующего кадра
                 self.drag_start_mouse_pos = (x, y)
@@ -418,26 +546,17 @@ class ManualCropManager:
             new_center_y = y - self.drag_start_offset[1]
             
             # Вычисляем текущий центр
-            points_array = np.array(self.current_points, dtype=np.float32)
-            current_center = np.mean(points_array, axis=0)
+            current_center = np.mean(self._cpts, axis=0)
             
             # Вычисляем смещение
             dx = new_center_x - current_center[0]
             dy = new_center_y - current_center[1]
             
-            # Применяем смещение ко всем точкам
-            new_points = []
-            for px, py in self.current_points:
-                new_x = int(px + dx)
-                new_y = int(py + dy)
-                
-                # Ограничиваем координаты пределами изображения
-                new_x = max(0, min(new_x, w - 1))
-                new_y = max(0, min(new_y, h - 1))
-                
-                new_points.append((new_x, new_y))
+            # Применяем смещение ко всем точкам и ограничиваем координаты пределами изображения
+            pts = (self._cpts + np.array([dx, dy], dtype=np.float32)).astype(np.int32)
+            np.clip(pts, 0, [w - 1, h - 1], out=pts)
             
-            self.current_points = new_points
+            self._cpts = pts
     
     def end_drag(self):
         """Заканчивает перетаскивание"""
@@ -446,36 +565,88 @@ class ManualCropManager:
         self.drag_start_offset = None
         self.dragging_edge = None
         self.drag_edge_offset = None
+        self._edge_perp = None
     
     def update_hover(self, x: int, y: int):
         """Обновляет индекс точки под курсором"""
         self.hover_point_index = self.find_point_at(x, y)
     
+    def _display_image(self) -> np.ndarray:
+        """Превью, уменьшенное до DISPLAY_MAX_SIZE по большей стороне (строится один раз на изображение)"""
+        if self._display is None:
+            h, w = self.current_image.shape[:2]
+            scale = min(1.0, self.DISPLAY_MAX_SIZE / max(h, w))
+            if scale < 1.0:
+                size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+                self._display = cv2.resize(self.current_image, size, interpolation=cv2.INTER_AREA)
+            else:
+                self._display = self.current_image
+            self._display_scale = scale
+        return self._display
+    
+    @staticmethod
+    def _blend_polygon(image: np.ndarray, points: np.ndarray, color: Tuple[int, int, int], alpha: float):
+        """Полупрозрачная заливка многоугольника, смешиваются только пиксели внутри его bounding box"""
+        x, y, bw, bh = cv2.boundingRect(points)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = min(x + bw, image.shape[1])
+        y1 = min(y + bh, image.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            return
+        roi = image[y0:y1, x0:x1]  # view - запись идет прямо в холст
+        mask = np.zeros(roi.shape[:2], np.uint8)
+        cv2.fillPoly(mask, [points - np.int32([x0, y0])], 255)
+        inside = mask.astype(bool)
+        blended = roi[inside] * (1.0 - alpha) + np.float32(color) * alpha
+        roi[inside] = np.rint(blended).astype(np.uint8)
+    
     def get_annotated_image(self) -> Optional[np.ndarray]:
         """Возвращает изображение с отмеченными точками и контуром"""
         if self.current_image is None:
             return None
+        
+        # Кадр зависит только от точек и состояния перетаскивания/наведения:
+        # если они не менялись, отдаем уже нарисованный холст
+        key = (self._cpts.tobytes(), self.dragging_point_index, self.hover_point_index,
+               self.dragging_area, self.dragging_edge)
+        if key == self._anno_key and self._canvas is not None:
+            return self._canvas
             
-        image = self.current_image.copy()
+        # Рисуем на кадре экранного размера: GUI все равно уменьшает его до canvas,
+        # а примитивы OpenCV стоят пропорционально числу затронутых пикселей
+        display = self._display_image()
+        k = self._display_scale
+        # Размеры маркеров и линий заданы в пикселях оригинала
+        marker_scale = k / self.PREVIEW_REDUCTION
+        
+        def sc(value: float) -> int:
+            """Размер из пикселей оригинала в пиксели экранного кадра"""
+            return max(1, int(round(value * marker_scale)))
+        
+        # Холст выделяется один раз на размер изображения и перезаполняется
+        # на каждой перерисовке вместо копии кадра
+        if self._canvas is None or self._canvas.shape != display.shape:
+            self._canvas = np.empty_like(display)
+        image = self._canvas
+        np.copyto(image, display)
+        
+        # Точки в координатах экранного кадра
+        display_points = self._cpts if k == 1.0 else np.rint(self._cpts * k).astype(np.int32)
         
         # Рисуем контур если есть 4 точки
-        if len(self.current_points) == 4:
-            points = np.array(self.current_points, dtype=np.int32)
+        if len(self._cpts) == 4:
+            points = display_points
             
             # Если перетаскиваем область или сторону, используем другой цвет
             if self.dragging_area or self.dragging_edge is not None:
-                cv2.polylines(image, [points], True, (255, 255, 0), 4)  # Желтый при перетаскивании
-                overlay = image.copy()
-                cv2.fillPoly(overlay, [points], (255, 255, 0))
-                cv2.addWeighted(overlay, 0.25, image, 0.75, 0, image)
+                cv2.polylines(image, [points], True, (255, 255, 0), sc(4))  # Желтый при перетаскивании
+                self._blend_polygon(image, points, (255, 255, 0), 0.25)
             else:
-                cv2.polylines(image, [points], True, (0, 255, 0), 3)  # Зеленый обычно
-                overlay = image.copy()
-                cv2.fillPoly(overlay, [points], (0, 255, 0))
-                cv2.addWeighted(overlay, 0.2, image, 0.8, 0, image)
+                cv2.polylines(image, [points], True, (0, 255, 0), sc(3))  # Зеленый обычно
+                self._blend_polygon(image, points, (0, 255, 0), 0.2)
         
         # Рисуем точки с улучшенным визуальным отображением (увеличенные размеры)
-        for i, (x, y) in enumerate(self.current_points):
+        for i, (x, y) in enumerate(display_points.tolist()):
             # Определяем цвет и размер точки (увеличено еще больше)
             if self.dragging_point_index == i:
                 color = (255, 255, 0)  # Желтый для перетаскиваемой
@@ -491,22 +662,23 @@ class ManualCropManager:
                 thickness = 4
             
             # Рисуем внешний круг (белый фон)
-            cv2.circle(image, (x, y), radius + 6, (255, 255, 255), -1)
+            cv2.circle(image, (x, y), sc(radius + 6), (255, 255, 255), -1)
             # Рисуем основной круг
-            cv2.circle(image, (x, y), radius, color, thickness)
+            cv2.circle(image, (x, y), sc(radius), color, sc(thickness))
             # Рисуем внутренний круг
-            cv2.circle(image, (x, y), radius - 8, color, -1)
+            cv2.circle(image, (x, y), sc(radius - 8), color, -1)
             
             # Номер точки (увеличенный шрифт)
-            font_scale = 1.5
-            cv2.putText(image, str(i + 1), (x + radius + 15, y - radius - 15), 
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), 4)
-            cv2.putText(image, str(i + 1), (x + radius + 15, y - radius - 15), 
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, 3)
+            font_scale = 1.5 * marker_scale
+            label_pos = (x + sc(radius + 15), y - sc(radius + 15))
+            cv2.putText(image, str(i + 1), label_pos, 
+                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), sc(4))
+            cv2.putText(image, str(i + 1), label_pos, 
+                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, sc(3))
         
         # Добавляем инструкцию
-        if len(self.current_points) < 4:
-            instruction = f"Щелкните 4 угла документа (по часовой стрелке) - {len(self.current_points)}/4"
+        if len(self._cpts) < 4:
+            instruction = f"Щелкните 4 угла документа (по часовой стрелке) - {len(self._cpts)}/4"
         else:
             if self.dragging_area:
                 instruction = "Перетаскивание области... Отпустите кнопку мыши для завершения"
@@ -520,22 +692,32 @@ class ManualCropManager:
         cv2.putText(image, instruction, (20, 40), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 1)
         
+        self._anno_key = key
         return image
     
     def crop_image(self) -> Optional[np.ndarray]:
         """Обрезает изображение по текущим точкам (простая обрезка по прямоугольнику)"""
-        if self.current_image is None or len(self.current_points) != 4:
+        if self.current_image is None or len(self._cpts) != 4:
             return None
         
+        # Обрезаем оригинал в полном разрешении, а не экранное превью
+        image, points = self._full_resolution()
+        if image is None:
+            return None
+        
+        return self._crop_points(image, points)
+    
+    def _crop_points(self, image: np.ndarray, points: List[Tuple[int, int]]) -> np.ndarray:
+        """Обрезает изображение по 4 точкам в его координатах"""
         # Используем функцию из image_processor для обрезки
         processor = CalibratedImageProcessor(None, self.calibration_config) if self.calibration_config else None
         
         if processor:
-            points_array = np.array(self.current_points, dtype=np.float32)
-            result = processor.rectangular_crop(self.current_image, points_array)
+            points_array = np.array(points, dtype=np.float32)
+            result = processor.rectangular_crop(image, points_array)
         else:
             # Простая обрезка без калибровки
-            result = self._simple_rectangular_crop(self.current_image, self.current_points)
+            result = self._simple_rectangular_crop(image, points)
         
         return result
     
@@ -574,14 +756,9 @@ class ManualCropManager:
     
     def _order_points(self, pts: np.ndarray) -> np.ndarray:
         """Упорядочивает точки: top-left, top-right, bottom-right, bottom-left"""
-        rect = np.zeros((4, 2), dtype="float32")
-        s = pts.sum(axis=1)
-        rect[0] = pts[np.argmin(s)]  # top-left
-        rect[2] = pts[np.argmax(s)]  # bottom-right
-        diff = np.diff(pts, axis=1)
-        rect[1] = pts[np.argmin(diff)]  # top-right
-        rect[3] = pts[np.argmax(diff)]  # bottom-left
-        return rect
+        s = pts.sum(axis=1)  # top-left - минимум, bottom-right - максимум
+        d = pts[:, 1] - pts[:, 0]  # top-right - минимум, bottom-left - максимум
+        return pts[[np.argmin(s), np.argmin(d), np.argmax(s), np.argmax(d)]].astype(np.float32)
     
     def save_crop(self, output_path: str, jpeg_quality: int = 85) -> bool:
         """Сохраняет обрезанное изображение и добавляет в калибровку
@@ -590,13 +767,14 @@ class ManualCropManager:
             output_path: Путь для сохранения файла
             jpeg_quality: Качество JPEG (60-100, по умолчанию 85)
         """
-        if self.current_image is None or len(self.current_points) != 4:
+        if self.current_image is None or len(self._cpts) != 4:
             return False
         
-        # Обрезаем изображение
-        cropped = self.crop_image()
-        if cropped is None:
+        # Обрезаем оригинал в полном разрешении; калибровка тоже учится на нем
+        full_image, full_points = self._full_resolution()
+        if full_image is None:
             return False
+        cropped = self._crop_points(full_image, full_points)
         
         # Ограничиваем качество в допустимых пределах
         jpeg_quality = max(60, min(100, int(jpeg_quality)))
@@ -604,18 +782,20 @@ class ManualCropManager:
         # Сохраняем
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
-        cv2.imwrite(str(output_file), cropped, [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality])
+        # Кодирование и запись идут в фоне, пока пользователь размечает следующее изображение
+        self._collect_saves()
+        self._pending_saves.append((output_file, self._pool.submit(self._write_crop, output_file, cropped, jpeg_quality)))
         
         # Добавляем в калибровку для улучшения алгоритма
         if self.calibration_manager is not None:
             print("🔧 Добавляем в калибровку для улучшения алгоритма...")
             # Используем менеджер калибровки для сохранения в ячейку
             temp_config = CalibrationConfig()
-            temp_config.analyze_calibration_image(self.current_image, self.current_points)
+            temp_config.analyze_calibration_image(full_image, full_points)
             
             # Определяем формат и сохраняем в соответствующую ячейку
-            h, w = self.current_image.shape[:2]
-            aspect_ratio, size_category = self.calibration_manager._determine_format(self.current_points, (w, h))
+            h, w = full_image.shape[:2]
+            aspect_ratio, size_category = self.calibration_manager._determine_format(full_points, (w, h))
             area_ratio = temp_config.document_area_ratio
             
             # Ищем подходящую ячейку
@@ -642,20 +822,59 @@ class ManualCropManager:
         elif self.calibration_config is not None:
             # Fallback на старый метод
             print("🔧 Добавляем в калибровку для улучшения алгоритма...")
-            self.calibration_config.analyze_calibration_image(self.current_image, self.current_points)
+            self.calibration_config.analyze_calibration_image(full_image, full_points)
             print(f"   ✅ Калибровка обновлена (образцов: {self.calibration_config.calibration_samples})")
         
         # Добавляем образец для истории ручной обрезки
-        h, w = self.current_image.shape[:2]
-        self.config.add_sample(self.current_points, (w, h))
+        h, w = full_image.shape[:2]
+        self.config.add_sample(full_points, (w, h))
         
         # Помечаем как сохраненное
         if self.current_index < len(self.image_paths):
             self.saved_indices.add(self.current_index)
+            self._processed[self.current_index] = True
             self.current_index += 1
         
         return True
     
+    @staticmethod
+    def _write_crop(output_file: Path, cropped: np.ndarray, jpeg_quality: int) -> bool:
+        """Записывает обрезку на диск (выполняется в фоновом потоке)"""
+        try:
+            ok = write_image(output_file, cropped, jpeg_quality)
+        except Exception as e:
+            print(f"❌ Ошибка сохранения {output_file}: {e}")
+            return False
+        if not ok:
+            print(f"❌ Не удалось сохранить: {output_file}")
+        return ok
+    
+    def _collect_saves(self, wait: bool = False):
+        """Проверяет завершенные фоновые записи (wait=True - дожидается всех) и запоминает неудачные"""
+        pending = []
+        for output_file, future in self._pending_saves:
+            if not wait and not future.done():
+                pending.append((output_file, future))
+                continue
+            try:
+                ok = future.result()
+            except Exception:
+                ok = False
+            if not ok:
+                self._failed_saves.append(output_file)
+        self._pending_saves = pending
+    
+    def pop_failed_saves(self, wait: bool = False) -> List[Path]:
+        """Возвращает файлы, которые не удалось записать, с момента прошлого вызова"""
+        self._collect_saves(wait)
+        failed, self._failed_saves = self._failed_saves, []
+        return failed
+    
+    def wait_for_saves(self) -> bool:
+        """Дожидается завершения всех фоновых сохранений, возвращает True если все успешны"""
+        self._collect_saves(wait=True)
+        return not self._failed_saves
+    
     def get_suggested_points(self) -> Optional[List[Tuple[int, int]]]:
         """Получает предложенные точки используя алгоритм из автоматической обработки"""
         if self.current_image is None:
@@ -665,6 +884,13 @@ class ManualCropManager:
         
         print("🔍 Анализ изображения для подсказки обрезки...")
         
+        # Детекторы и калибровка работают в пикселях оригинала (ядра морфологии,
+        # расширение контура), поэтому ищем на полном разрешении, а не на превью
+        image = read_image(self.current_image_path)
+        if image is None:
+            print("   ⚠️ Не удалось прочитать изображение в полном разрешении")
+            return self._history_points(w, h)
+        
         # Всегда используем алгоритм из автоматической обработки
         try:
             from scanner.image_processor import ProcessingConfig
@@ -678,7 +904,7 @@ class ManualCropManager:
             # Если калибровка есть - используем полный алгоритм
             if self.calibration_config and self.calibration_config.calibrated:
                 print("   Используем алгоритм автоматической обработки с калибровкой...")
-                contour = processor.find_document_auto(self.current_image)
+                contour = processor.find_document_auto(image)
             
             # Если не нашли или калибровки нет - пробуем все методы вручную
             if contour is None:
@@ -686,50 +912,49 @@ class ManualCropManager:
                 
                 # Метод 0: Светлый документ на темном фоне
                 if self.calibration_config and self.calibration_config.calibrated:
-                    contour = processor._find_light_on_dark(self.current_image)
+                    contour = processor._find_light_on_dark(image)
                     if contour is not None:
                         print("   ✅ Найден как светлый документ на темном фоне")
                 
                 # Метод 0.5: Края документа
                 if contour is None and self.calibration_config and self.calibration_config.calibrated:
-                    contour = processor._find_document_edges(self.current_image)
+                    contour = processor._find_document_edges(image)
                     if contour is not None:
                         print("   ✅ Найден по краям документа")
                 
                 # Метод 1: Поиск по краям
                 if contour is None and self.calibration_config and self.calibration_config.calibrated:
-                    contour = processor._find_by_edges(self.current_image)
+                    contour = processor._find_by_edges(image)
                     if contour is not None:
                         print("   ✅ Найден по краям")
                 
                 # Метод 2: Поиск по цвету
                 if contour is None and self.calibration_config and self.calibration_config.calibrated:
-                    contour = processor._find_by_color(self.current_image)
+                    contour = processor._find_by_color(image)
                     if contour is not None:
                         print("   ✅ Найден по цвету")
                 
                 # Метод 3: Поиск по текстуре
                 if contour is None and self.calibration_config and self.calibration_config.calibrated:
-                    contour = processor._find_by_texture(self.current_image)
+                    contour = processor._find_by_texture(image)
                     if contour is not None:
                         print("   ✅ Найден по текстуре")
                 
                 # Метод 4: Ослабленные ограничения
                 if contour is None:
-                    contour = processor._find_with_relaxed_constraints(self.current_image)
+                    contour = processor._find_with_relaxed_constraints(image)
                     if contour is not None:
                         print("   ✅ Найден с ослабленными ограничениями")
                 
                 # Метод 5: Любой большой прямоугольник (работает без калибровки)
                 if contour is None:
-                    contour = processor._find_any_large_rectangle(self.current_image)
+                    contour = processor._find_any_large_rectangle(image)
                     if contour is not None:
                         print("   ✅ Найден большой прямоугольный контур")
             
             if contour is not None:
-                # Преобразуем контур в список точек
-                points = contour.reshape(4, 2).tolist()
-                detected_points = [(int(p[0]), int(p[1])) for p in points]
+                # Преобразуем контур в список точек в координатах превью
+                detected_points = self._rescale_points(contour.reshape(4, 2), image.shape, self.current_image.shape)
                 print(f"   ✅ Документ найден алгоритмом автоматической обработки: {detected_points}")
                 return detected_points
             else:
@@ -740,6 +965,10 @@ class ManualCropManager:
             import traceback
             traceback.print_exc()
         
+        return self._history_points(w, h)
+    
+    def _history_points(self, w: int, h: int) -> Optional[List[Tuple[int, int]]]:
+        """Подсказка из истории ручных обрезок для превью размера (w, h)"""
         # Если ничего не нашли, пробуем использовать только историю как fallback
         print("   Используем историю как fallback...")
         historical_points = self.config.get_suggested_points((w, h))
@@ -749,18 +978,37 @@ class ManualCropManager:
             print("   ❌ Подсказка недоступна")
         return historical_points
     
+    @staticmethod
+    def _shoelace_area(pts: np.ndarray) -> float:
+        """Площадь многоугольника (N, 2) по формуле шнурования"""
+        x = pts[:, 0]
+        y = pts[:, 1]
+        return 0.5 * abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))))
+    
     def _validate_quadrilateral(self, points: List[Tuple[int, int]], image_area: float) -> bool:
-        """Проверяет что четырехугольник валиден и похож на документ"""
+        """Проверяет что четырехугольник валиден и похож на документ
+        
+        Проверки идут от дешевых к дорогим: большинство кандидатов отсекается до углов
+        """
         if len(points) != 4:
             return False
         
         pts_array = np.array(points, dtype=np.float32)
         
-        # Проверяем площадь
-        area = cv2.contourArea(pts_array)
+        # Проверяем площадь (формула шнурования вместо вызова OpenCV)
+        area = self._shoelace_area(pts_array)
         if area < image_area * 0.1 or area > image_area * 0.95:  # От 10% до 95%
             return False
         
+        # Проверяем выпуклость; у выпуклого четырехугольника (обычный результат
+        # approxPolyDP) оболочка совпадает с ним самим, и solidity = 1
+        if not cv2.isContourConvex(pts_array):
+            hull_area = self._shoelace_area(cv2.convexHull(pts_array).reshape(-1, 2))
+            if hull_area > 0:
+                solidity = area / hull_area
+                if solidity < 0.85:  # Должно быть достаточно выпуклым
+                    return False
+        
         # Проверяем прямоугольность через минимальный ограничивающий прямоугольник
         rect = cv2.minAreaRect(pts_array)
         width, height = rect[1]
@@ -772,31 +1020,16 @@ class ManualCropManager:
         if aspect_ratio > 10.0:  # Слишком вытянутое
             return False
         
-        # Проверяем выпуклость
-        hull = cv2.convexHull(pts_array)
-        hull_area = cv2.contourArea(hull)
-        if hull_area > 0:
-            solidity = area / hull_area
-            if solidity < 0.85:  # Должно быть достаточно выпуклым
-                return False
-        
-        # Проверяем углы (должны быть близки к 90 градусам)
-        angles = []
-        for i in range(4):
-            p1 = pts_array[i]
-            p2 = pts_array[(i + 1) % 4]
-            p3 = pts_array[(i + 2) % 4]
-            
-            v1 = p1 - p2
-            v2 = p3 - p2
-            
-            cos_angle = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2) + 1e-6)
-            cos_angle = np.clip(cos_angle, -1, 1)
-            angle = np.arccos(cos_angle) * 180 / np.pi
-            angles.append(angle)
+        # Проверяем углы (должны быть близки к 90 градусам) - все четыре вершины сразу
+        vertices = np.roll(pts_array, -1, axis=0)
+        v1 = pts_array - vertices
+        v2 = np.roll(pts_array, -2, axis=0) - vertices
+        cos_angles = np.einsum('ij,ij->i', v1, v2) / (
+            np.linalg.norm(v1, axis=1) * np.linalg.norm(v2, axis=1) + 1e-6)
+        angles = np.degrees(np.arccos(np.clip(cos_angles, -1, 1)))
         
         # Среднее отклонение от 90 градусов не должно быть слишком большим
-        avg_deviation = np.mean([abs(a - 90) for a in angles])
+        avg_deviation = np.mean(np.abs(angles - 90))
         if avg_deviation > 45:  # Слишком не прямоугольный
             return False
         
@@ -804,9 +1037,10 @@ class ManualCropManager:
     
     def _get_best_corners(self, contour: np.ndarray) -> Optional[np.ndarray]:
         """Находит 4 лучших угловых точки из контура"""
-        # Сначала пробуем упростить контур
+        # Сначала пробуем упростить контур; периметр от epsilon не зависит
+        peri = cv2.arcLength(contour, True)
         for eps_factor in [0.01, 0.02, 0.03, 0.05, 0.08]:
-            epsilon = eps_factor * cv2.arcLength(contour, True)
+            epsilon = eps_factor * peri
             approx = cv2.approxPolyDP(contour, epsilon, True)
             
             if len(approx) == 4:
@@ -820,18 +1054,14 @@ class ManualCropManager:
                     # Находим центр
                     center = np.mean(hull_pts, axis=0)
                     
-                    # Вычисляем углы от центра
-                    angles = []
-                    for pt in hull_pts:
-                        angle = np.arctan2(pt[1] - center[1], pt[0] - center[0])
-                        angles.append((angle, pt))
-                    angles.sort()
+                    # Сортируем точки по углу от центра
+                    angles = np.arctan2(hull_pts[:, 1] - center[1], hull_pts[:, 0] - center[0])
+                    sorted_pts = hull_pts[np.argsort(angles)]
                     
                     # Берем 4 точки равномерно распределенные по углам
-                    if len(angles) >= 4:
-                        step = len(angles) // 4
-                        selected = [angles[i * step][1] for i in range(4)]
-                        return np.array(selected, dtype=np.int32).reshape(-1, 1, 2)
+                    step = len(sorted_pts) // 4
+                    selected = sorted_pts[np.arange(4) * step]
+                    return selected.astype(np.int32).reshape(-1, 1, 2)
         
         return None
     
@@ -1,7 +1,30 @@
 import cv2
 import numpy as np
+from functools import lru_cache
+from math import hypot
 from typing import Tuple, List
 
+# Углы "вида сверху" (tl, tr, br, bl) для единичного прямоугольника
+_UNIT_CORNERS = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype="float32")
+
+@lru_cache(maxsize=16)
+def _perspective_matrix(rect_key: bytes, width: int, height: int, margin: int) -> np.ndarray:
+    """Матрица перспективы для углов rect_key (float32 (4, 2) в байтах) и размера результата без отступов
+    
+    При пакетной обработке соседние страницы сняты с одной позиции камеры,
+    поэтому одинаковые четырехугольники повторяются и решение системы берется из кэша
+    """
+    rect = np.frombuffer(rect_key, dtype=np.float32).reshape(4, 2)
+    
+    # Формируем набор точек для "вида сверху" масштабированием единичного шаблона
+    dst = _UNIT_CORNERS * np.float32([width - 1, height - 1])
+    if margin:
+        dst += margin
+    
+    M = cv2.getPerspectiveTransform(rect, dst)
+    M.flags.writeable = False  # Общий для всех попаданий в кэш
+    return M
+
 class PerspectiveTransformer:
     """Класс для выравнивания перспективы документа"""
     
@@ -11,17 +34,14 @@ class PerspectiveTransformer:
         Упорядочивает точки в порядке:
         верх-лево, верх-право, низ-право, низ-лево
         """
-        rect = np.zeros((4, 2), dtype="float32")
+        x = pts[:, 0]
+        y = pts[:, 1]
+        s = x + y  # верх-лево имеет наименьшую сумму, низ-право - наибольшую
+        diff = y - x  # верх-право имеет наименьшую разность, низ-лево - наибольшую
         
-        s = pts.sum(axis=1)
-        rect[0] = pts[np.argmin(s)]  # верх-лево имеет наименьшую сумму
-        rect[2] = pts[np.argmax(s)]  # низ-право имеет наибольшую сумму
-        
-        diff = np.diff(pts, axis=1)
-        rect[1] = pts[np.argmin(diff)]  # верх-право имеет наименьшую разность
-        rect[3] = pts[np.argmax(diff)]  # низ-лево имеет наибольшую разность
-        
-        return rect
+        # Все четыре угла одним индексированием
+        order = [s.argmin(), diff.argmin(), s.argmax(), diff.argmax()]
+        return pts[order].astype("float32")
     
     def four_point_transform(self, image: np.ndarray, pts: np.ndarray, 
                            margin: int = 0) -> np.ndarray:
@@ -29,31 +49,27 @@ class PerspectiveTransformer:
         Применяет преобразование перспективы к четырехугольной области
         """
         rect = self.order_points(pts)
-        (tl, tr, br, bl) = rect
+        # Расстояния по скалярным координатам: np.linalg.norm для 2 элементов - в основном накладные расходы
+        (tlx, tly), (trx, try_), (brx, bry), (blx, bly) = rect.tolist()
         
         # Вычисляем ширину новой картинки
-        widthA = np.linalg.norm(br - bl)
-        widthB = np.linalg.norm(tr - tl)
+        widthA = hypot(brx - blx, bry - bly)
+        widthB = hypot(trx - tlx, try_ - tly)
         maxWidth = max(int(widthA), int(widthB))
         
         # Вычисляем высоту новой картинки
-        heightA = np.linalg.norm(tr - br)
-        heightB = np.linalg.norm(tl - bl)
+        heightA = hypot(trx - brx, try_ - bry)
+        heightB = hypot(tlx - blx, tly - bly)
         maxHeight = max(int(heightA), int(heightB))
         
+        # Вычисляем матрицу преобразования; углы округляем до 0.1 px,
+        # чтобы почти совпадающие четырехугольники попадали в кэш
+        M = _perspective_matrix(np.round(rect, 1).tobytes(), maxWidth, maxHeight, margin)
+        
         # Добавляем отступы
         maxWidth += 2 * margin
         maxHeight += 2 * margin
         
-        # Формируем набор точек для "вида сверху"
-        dst = np.array([
-            [margin, margin],
-            [maxWidth - 1 - margin, margin],
-            [maxWidth - 1 - margin, maxHeight - 1 - margin],
-            [margin, maxHeight - 1 - margin]], dtype="float32")
-        
-        # Вычисляем матрицу преобразования и применяем ее
-        M = cv2.getPerspectiveTransform(rect, dst)
         warped = cv2.warpPerspective(image, M, (maxWidth, maxHeight))
         
         return warped
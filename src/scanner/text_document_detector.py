@@ -1,21 +1,90 @@
 import cv2
+import weakref
 import numpy as np
 from typing import Optional, Tuple, List
 from pathlib import Path
+from utils.jit import NUMBA_AVAILABLE, njit
+
+@njit(cache=True)
+def _page_border_scan(strip: np.ndarray, axis: int, last: bool) -> int:
+    """Индекс первого (last=False) или последнего перепада профиля яркости полосы, -1 если его нет
+    
+    Профиль - средние по axis (как np.mean(strip, axis=axis)), порог - 1.1 * среднее профиля
+    """
+    rows, cols = strip.shape
+    n = cols if axis == 0 else rows
+    hist = np.zeros(n)
+    # Один проход по полосе в порядке хранения
+    for i in range(rows):
+        for j in range(cols):
+            if axis == 0:
+                hist[j] += strip[i, j]
+            else:
+                hist[i] += strip[i, j]
+    count = rows if axis == 0 else cols
+    total = 0.0
+    for k in range(n):
+        hist[k] /= count
+        total += hist[k]
+    threshold = total / n * 1.1
+    # Второй проход - по профилю, без промежуточных булевых массивов
+    border = -1
+    for k in range(n - 1):
+        if (hist[k] > threshold) != (hist[k + 1] > threshold):
+            border = k
+            if not last:
+                break
+    return border
+
+@njit(cache=True)
+def _or3(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """Побитовое ИЛИ трех масок за один проход"""
+    out = np.empty_like(a)
+    rows, cols = a.shape
+    for i in range(rows):
+        for j in range(cols):
+            out[i, j] = a[i, j] | b[i, j] | c[i, j]
+    return out
 
 class TextDocumentDetector:
     """Специализированный детектор для текстовых документов на белом фоне"""
     
+    # Ядра морфологии создаются один раз на класс
+    _K3 = np.ones((3, 3), np.uint8)
+    _K2 = np.ones((2, 2), np.uint8)
+    _KV21 = np.ones((2, 1), np.uint8)  # Вертикальное ядро для текста
+    
     def __init__(self):
         self.min_text_area_ratio = 0.3  # Минимум 30% текстовой области
         self.margin_ratio = 0.05  # 5% отступ
+        self.max_detection_size = 1024  # Большая сторона изображения для поиска текста
+        # Grayscale последнего изображения: слабая ссылка на источник, чтобы не держать
+        # его в памяти и не спутать с новым массивом по переиспользованному id()
+        self._gray_source: Optional[weakref.ref] = None
+        self._gray: Optional[np.ndarray] = None
+    
+    def _ensure_gray(self, image: np.ndarray) -> np.ndarray:
+        """Grayscale-версия изображения, повторно для того же массива не пересчитывается"""
+        if self._gray_source is None or self._gray_source() is not image:
+            self._gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            self._gray_source = weakref.ref(image)
+        return self._gray
     
     def detect_text_regions(self, image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
         """
         Обнаруживает текстовые регионы и возвращает bounding box (x, y, w, h)
         """
         # Конвертируем в grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = self._ensure_gray(image)
+        
+        # Все три метода работают на уменьшенной копии: для поиска области текста
+        # полное разрешение не нужно, а каждый метод проходит по всем пикселям
+        h, w = gray.shape
+        scale = max(1.0, max(h, w) / self.max_detection_size)
+        if scale > 1.0:
+            gray = cv2.resize(gray, (max(1, int(w / scale)), max(1, int(h / scale))),
+                              interpolation=cv2.INTER_AREA)
+        min_contour_area = 100 / (scale * scale)  # 100 пикселей исходного изображения
         
         # Метод 1: Поиск текста через адаптивный порог
         binary1 = self._adaptive_threshold_method(gray)
@@ -27,13 +96,16 @@ class TextDocumentDetector:
         binary3 = self._morphological_method(gray)
         
         # Комбинируем все методы
-        combined = cv2.bitwise_or(binary1, binary2)
-        combined = cv2.bitwise_or(combined, binary3)
+        if NUMBA_AVAILABLE:
+            combined = _or3(binary1, binary2, binary3)
+        else:
+            # Маски методов больше не нужны - пишем результат в первую, без временных
+            combined = np.bitwise_or(binary1, binary2, out=binary1)
+            np.bitwise_or(combined, binary3, out=combined)
         
         # Улучшаем маску
-        kernel = np.ones((3, 3), np.uint8)
-        combined = cv2.morphologyEx(combined, cv2.MORPH_CLOSE, kernel)
-        combined = cv2.morphologyEx(combined, cv2.MORPH_OPEN, kernel)
+        combined = cv2.morphologyEx(combined, cv2.MORPH_CLOSE, self._K3)
+        combined = cv2.morphologyEx(combined, cv2.MORPH_OPEN, self._K3)
         
         # Находим контуры текстовых блоков
         contours, _ = cv2.findContours(combined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -41,24 +113,22 @@ class TextDocumentDetector:
         if not contours:
             return None
         
-        # Объединяем все текстовые блоки в один bounding box
-        all_points = []
-        for contour in contours:
-            if cv2.contourArea(contour) > 100:  # Игнорируем очень маленькие контуры
-                x, y, w, h = cv2.boundingRect(contour)
-                all_points.extend([(x, y), (x + w, y + h)])
-        
-        if not all_points:
+        # Игнорируем очень маленькие контуры
+        text_contours = [c for c in contours if cv2.contourArea(c) > min_contour_area]
+        if not text_contours:
             return None
         
-        # Находим общий bounding box всех текстовых областей
-        all_points = np.array(all_points)
-        x_min = np.min(all_points[:, 0])
-        y_min = np.min(all_points[:, 1])
-        x_max = np.max(all_points[:, 0])
-        y_max = np.max(all_points[:, 1])
-        
-        return (x_min, y_min, x_max - x_min, y_max - y_min)
+        # Объединяем все текстовые блоки в один bounding box одним вызовом по всем точкам
+        x_min, y_min, bw, bh = cv2.boundingRect(np.vstack(text_contours))
+        x_max = x_min + bw
+        y_max = y_min + bh
+        
+        # Возвращаем bounding box в координатах исходного изображения
+        x0 = int(x_min * scale)
+        y0 = int(y_min * scale)
+        x1 = min(w, int(round(x_max * scale)))
+        y1 = min(h, int(round(y_max * scale)))
+        return (x0, y0, x1 - x0, y1 - y0)
     
     def _adaptive_threshold_method(self, gray: np.ndarray) -> np.ndarray:
         """Метод адаптивного порога для текста"""
@@ -69,8 +139,7 @@ class TextDocumentDetector:
         )
         
         # Удаляем очень маленькие объекты (шум)
-        kernel = np.ones((2, 2), np.uint8)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, self._K2)
         
         return binary
     
@@ -80,19 +149,21 @@ class TextDocumentDetector:
         edges = cv2.Canny(gray, 50, 150)
         
         # Морфологические операции для соединения текстовых линий
-        kernel = np.ones((2, 1), np.uint8)  # Вертикальное ядро для текста
-        edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+        edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, self._KV21)
         
         return edges
     
     def _morphological_method(self, gray: np.ndarray) -> np.ndarray:
         """Морфологический метод для текста"""
-        # Создаем маску для текста через градиенты
-        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
+        # Создаем маску для текста через градиенты: int16 вместо float64,
+        # модуль градиента - L1-приближение сразу в uint8.
+        # Ответ Sobel 3x3 на uint8 не больше 1020, поэтому масштаб 1/4 без насыщения
+        grad_x = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3), alpha=0.25)
+        grad_y = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3), alpha=0.25)
         
-        gradient = cv2.magnitude(grad_x, grad_y)
-        gradient = np.uint8(255 * gradient / np.max(gradient))
+        gradient = cv2.addWeighted(grad_x, 0.5, grad_y, 0.5, 0)
+        # Растягиваем до максимума 255 одним проходом OpenCV (NORM_INF - масштаб по максимуму)
+        gradient = cv2.normalize(gradient, None, 255, 0, cv2.NORM_INF, dtype=cv2.CV_8U)
         
         # Порог для текстовых областей
         _, text_mask = cv2.threshold(gradient, 30, 255, cv2.THRESH_BINARY)
@@ -150,13 +221,10 @@ class TextDocumentDetector:
         """
         Метод поиска границ страницы через анализ гистограмм
         """
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = self._ensure_gray(image)
         
         # Анализ гистограмм по краям для поиска границ страницы
-        left_border = self._find_page_border(gray, 'left')
-        right_border = self._find_page_border(gray, 'right')
-        top_border = self._find_page_border(gray, 'top')
-        bottom_border = self._find_page_border(gray, 'bottom')
+        left_border, right_border, top_border, bottom_border = self._all_page_borders(gray)
         
         if all(border is not None for border in [left_border, right_border, top_border, bottom_border]):
             # Создаем контур из найденных границ
@@ -172,10 +240,54 @@ class TextDocumentDetector:
         
         return None
     
+    def _all_page_borders(self, gray: np.ndarray) -> Tuple[Optional[int], ...]:
+        """Границы страницы (left, right, top, bottom) по всем четырем полосам сразу"""
+        h, w = gray.shape
+        if NUMBA_AVAILABLE or min(h, w) < 50:
+            # Numba-ядро и так проходит полосу за два прохода; у узких изображений
+            # полосы разной длины и в один массив не складываются
+            return tuple(self._find_page_border(gray, side) for side in ('left', 'right', 'top', 'bottom'))
+        
+        # Профили четырех полос в одном массиве (4, 50): порог, перепады и поиск - общими операциями
+        profiles = np.stack([
+            gray[:, :50].mean(axis=0),
+            gray[:, -50:].mean(axis=0),
+            gray[:50, :].mean(axis=1),
+            gray[-50:, :].mean(axis=1),
+        ])
+        above = profiles > profiles.mean(axis=1, keepdims=True) * 1.1
+        changes = above[:, 1:] != above[:, :-1]
+        found = changes.any(axis=1)
+        first = changes.argmax(axis=1)
+        last = changes.shape[1] - 1 - changes[:, ::-1].argmax(axis=1)
+        
+        left, right, top, bottom = found.tolist()
+        return (
+            int(first[0]) if left else None,
+            w - 50 + int(last[1]) if right else None,
+            int(first[2]) if top else None,
+            h - 50 + int(last[3]) if bottom else None,
+        )
+    
     def _find_page_border(self, gray: np.ndarray, side: str) -> Optional[int]:
         """Находит границу страницы анализируя гистограмму"""
         h, w = gray.shape
         
+        if NUMBA_AVAILABLE:
+            if side == 'left':
+                border = _page_border_scan(gray[:, :50], 0, False)
+                return border if border >= 0 else None
+            elif side == 'right':
+                border = _page_border_scan(gray[:, -50:], 0, True)
+                return w - 50 + border if border >= 0 else None
+            elif side == 'top':
+                border = _page_border_scan(gray[:50, :], 1, False)
+                return border if border >= 0 else None
+            elif side == 'bottom':
+                border = _page_border_scan(gray[-50:, :], 1, True)
+                return h - 50 + border if border >= 0 else None
+            return None
+        
         if side == 'left':
             strip = gray[:, :50]  # Левая полоса 50px
             hist = np.mean(strip, axis=0)
@@ -1,20 +1,23 @@
 import os
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
+from utils.image_io import JPEG_EXTENSIONS
 
-def get_jpeg_files(folder_path: str) -> List[Path]:
-    """Возвращает список JPEG файлов в указанной папке"""
+def get_jpeg_files_iter(folder_path: str) -> Iterator[Path]:
+    """Лениво перебирает JPEG файлы папки в порядке каталога (без сортировки)"""
     folder = Path(folder_path)
     if not folder.exists():
-        return []
-    
-    extensions = ['*.jpg', '*.jpeg', '*.JPG', '*.JPEG']
-    image_files = []
-    
-    for extension in extensions:
-        image_files.extend(folder.glob(extension))
+        return
     
-    return sorted(image_files)
+    # Один проход по папке вместо glob на каждый вариант регистра расширения
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in JPEG_EXTENSIONS:
+                yield Path(entry.path)
+
+def get_jpeg_files(folder_path: str) -> List[Path]:
+    """Возвращает список JPEG файлов в указанной папке"""
+    return sorted(get_jpeg_files_iter(folder_path))
 
 def create_output_folder(base_path: str, suffix: str = "_cropped") -> str:
     """Создает папку для сохранения результатов"""
@@ -0,0 +1,74 @@
+"""
+Чтение и запись изображений
+JPEG кодируется/декодируется напрямую через libjpeg-turbo (PyTurboJPEG), если он установлен,
+остальные форматы и все случаи без PyTurboJPEG обрабатываются через OpenCV
+"""
+
+import io
+from pathlib import Path
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _tj = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, RuntimeError, OSError):
+    # Нет модуля или не найдена сама библиотека libturbojpeg
+    _tj = None
+    TURBOJPEG_AVAILABLE = False
+
+JPEG_EXTENSIONS = {'.jpg', '.jpeg'}
+
+# Флаги OpenCV для чтения с уменьшением (для JPEG - DCT-масштабирование в libjpeg)
+_CV2_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def _exif_orientation(data: bytes) -> int:
+    """Возвращает EXIF-ориентацию JPEG (1 - без поворота)"""
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as img:
+            return img.getexif().get(0x0112, 1)
+    except Exception:
+        return 1
+
+def read_image(path: Union[str, Path], reduce: int = 1) -> Optional[np.ndarray]:
+    """Читает изображение в BGR, возвращает None если файл не удалось прочитать
+    
+    reduce (1, 2, 4 или 8) уменьшает изображение при декодировании
+    """
+    path = str(path)
+    if _tj is not None and Path(path).suffix.lower() in JPEG_EXTENSIONS:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # cv2.imread поворачивает снимок по EXIF, TurboJPEG - нет,
+            # поэтому повернутые снимки читаем через OpenCV
+            if _exif_orientation(data) == 1:
+                if reduce == 1:
+                    return _tj.decode(data, pixel_format=TJPF_BGR)
+                return _tj.decode(data, pixel_format=TJPF_BGR, scaling_factor=(1, reduce))
+        except Exception:
+            pass
+    return cv2.imread(path, _CV2_REDUCED_FLAGS[reduce])
+
+def write_image(path: Union[str, Path], image: np.ndarray, jpeg_quality: int = 95) -> bool:
+    """Сохраняет изображение; для JPEG использует заданное качество"""
+    path = str(path)
+    if _tj is not None and Path(path).suffix.lower() in JPEG_EXTENSIONS:
+        try:
+            data = _tj.encode(np.ascontiguousarray(image), quality=jpeg_quality,
+                              pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+            with open(path, 'wb') as f:
+                f.write(data)
+            return True
+        except Exception:
+            pass
+    return cv2.imwrite(path, image, [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality])
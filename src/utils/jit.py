@@ -0,0 +1,20 @@
+"""
+JIT-компиляция горячих числовых функций через Numba
+Если numba не установлена, декоратор njit возвращает функцию без изменений
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Заглушка numba.njit: работает как @njit и как @njit(cache=True)"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+
+        return decorator